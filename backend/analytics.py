@@ -0,0 +1,146 @@
+"""
+Capacity analytics: load factor, remaining weight and revenue over a departure date range.
+
+The flights of the range are read once into NumPy metric columns. Each grouping (route,
+airline, origin, day) is then one factorize pass plus a bincount per metric, so no Python
+loop runs per flight and metric. The aggregation runs in the threadpool, off the event loop.
+Reports are cached for CAPACITY_TTL_S only, because booked weight changes with every booking.
+
+NumPy is imported on first use, which keeps it out of API cold starts.
+"""
+import json
+from datetime import date, datetime, timezone
+from operator import itemgetter
+from typing import TYPE_CHECKING, Dict, Iterator, List, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+import resilience
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DIMENSIONS = ("route", "airline", "origin", "day")
+CAPACITY_TTL_S = 60
+MAX_RANGE_DAYS = 366
+# Flights with this little room left (plus the booking's weight) take the Redis lock in reserve_capacity
+NEAR_FULL_KG = 100
+COLUMNS = "origin, destination, airline_name, departure_datetime, max_weight_kg, booked_weight_kg, base_price_per_kg"
+
+
+def report_key(start: date, end: date, group_by: Sequence[str]) -> str:
+    return f"analytics:capacity:{start.isoformat()}:{end.isoformat()}:{','.join(group_by)}"
+
+
+def normalize_dimensions(group_by: Sequence[str]) -> List[str]:
+    """Requested dimensions in canonical order, so equal requests share a cache entry."""
+    unknown = sorted(set(group_by) - set(DIMENSIONS))
+    if unknown:
+        raise ValueError(f"Unknown dimensions: {unknown}, use {', '.join(DIMENSIONS)}")
+    return [d for d in DIMENSIONS if d in group_by]
+
+
+def _column(rows: List[dict], name: str) -> Iterator:
+    return map(itemgetter(name), rows)
+
+
+# Group key of every flight; map/itemgetter keep the per-flight work in C
+GROUP_KEYS = {
+    "route": lambda rows: map("-".join, zip(_column(rows, "origin"), _column(rows, "destination"))),
+    "airline": lambda rows: _column(rows, "airline_name"),
+    "origin": lambda rows: _column(rows, "origin"),
+    # Departures are UTC ISO strings, so the day is their date part
+    "day": lambda rows: map(itemgetter(slice(0, 10)), _column(rows, "departure_datetime")),
+}
+
+
+def _metrics(rows: List[dict]) -> Dict[str, "np.ndarray"]:
+    """Per-flight metric columns, summed per group."""
+    import numpy as np
+
+    n = len(rows)
+    max_weight = np.fromiter(_column(rows, "max_weight_kg"), dtype=np.float64, count=n)
+    booked = np.fromiter(_column(rows, "booked_weight_kg"), dtype=np.float64, count=n)
+    price = np.fromiter(_column(rows, "base_price_per_kg"), dtype=np.float64, count=n)
+    remaining = np.clip(max_weight - booked, 0, None)
+    return {
+        "capacity_kg": max_weight,
+        "booked_kg": booked,
+        "remaining_kg": remaining,
+        "revenue": booked * price,
+        "remaining_revenue": remaining * price,
+        "near_full_flights": (remaining <= NEAR_FULL_KG).astype(np.float64),
+    }
+
+
+def _factorize(rows: List[dict], dimension: str) -> Tuple[list, "np.ndarray"]:
+    """Sorted group keys and each flight's group index (a dict pass, cheaper than np.unique on strings)."""
+    import numpy as np
+
+    values = list(GROUP_KEYS[dimension](rows))
+    keys = sorted(set(values))
+    index = {key: i for i, key in enumerate(keys)}
+    return keys, np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+
+
+def _summaries(flights: "np.ndarray", sums: Dict[str, "np.ndarray"]) -> Dict[str, list]:
+    """Per-group output columns as plain Python lists."""
+    import numpy as np
+
+    capacity = sums["capacity_kg"]
+    load_factor = np.divide(sums["booked_kg"], capacity, out=np.zeros(len(capacity)), where=capacity > 0)
+    return {
+        "flights": flights.astype(np.int64).tolist(),
+        "capacity_kg": capacity.astype(np.int64).tolist(),
+        "booked_kg": sums["booked_kg"].astype(np.int64).tolist(),
+        "remaining_kg": sums["remaining_kg"].astype(np.int64).tolist(),
+        "load_factor": np.round(load_factor, 4).tolist(),
+        "revenue": np.round(sums["revenue"], 2).tolist(),
+        "remaining_revenue": np.round(sums["remaining_revenue"], 2).tolist(),
+        "near_full_flights": sums["near_full_flights"].astype(np.int64).tolist(),
+    }
+
+
+def capacity_report(rows: List[dict], group_by: Sequence[str] = DIMENSIONS) -> dict:
+    """Totals and per-dimension groups (sorted by key) for the given flight rows."""
+    import numpy as np
+
+    metrics = _metrics(rows)
+    totals = _summaries(np.array([len(rows)]), {name: np.array([values.sum()]) for name, values in metrics.items()})
+    report = {"totals": {name: values[0] for name, values in totals.items()}, "groups": {}}
+    for dimension in group_by:
+        keys, codes = _factorize(rows, dimension)
+        counts = np.bincount(codes, minlength=len(keys))
+        sums = {name: np.bincount(codes, weights=values, minlength=len(keys)) for name, values in metrics.items()}
+        columns = _summaries(counts, sums)
+        report["groups"][dimension] = [
+            {"key": key, **{name: values[i] for name, values in columns.items()}} for i, key in enumerate(keys)
+        ]
+    return report
+
+
+async def cached_capacity_report(repo, redis, start: date, end: date, group_by: Sequence[str]) -> str:
+    """Capacity report as JSON for departures from `start` to `end` (inclusive UTC days), cached briefly."""
+    key = report_key(start, end, group_by)
+    try:
+        cached = await redis.get(key)
+        if cached:
+            return cached
+    except Exception as e:
+        if not isinstance(e, resilience.CircuitOpenError):
+            print(f"Redis Cache Error: {e}")
+
+    rows = await repo.list_flights_departing(
+        datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc),
+        datetime.combine(end, datetime.max.time(), tzinfo=timezone.utc),
+        columns=COLUMNS,
+    )
+    report = {"start": start.isoformat(), "end": end.isoformat(), **await run_in_threadpool(capacity_report, rows, group_by)}
+    payload = json.dumps(report, separators=(",", ":"))
+
+    try:
+        await redis.set(key, payload, ex=CAPACITY_TTL_S)
+    except Exception as e:
+        if not isinstance(e, resilience.CircuitOpenError):
+            print(f"Redis Set Error: {e}")
+    return payload
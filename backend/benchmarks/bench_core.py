@@ -0,0 +1,311 @@
+"""
+Benchmarks for the search and booking cores on a synthetic network.
+
+Each size seeds an in-memory SQLite database from `benchmarks.network` and drives
+the real FastAPI app in-process (httpx ASGI transport). Every storage and cache
+call is delayed by --store-latency-ms to stand in for a network round trip, so
+the numbers reflect how many sequential hops a request needs.
+
+Scenarios:
+    route_search         GET /route on random airport pairs/days, cache always cold
+    capacity_contention  concurrent POST /bookings on one nearly-full flight
+    timeline_read        GET /bookings/{ref_id} for bookings with several events
+
+Medians are machine-specific, so every run also times a fixed calibration workload
+(pydantic validation, JSON and sorting of flight rows, no app code). When this machine
+is slower than the one that recorded baseline.json, the limits widen by the ratio of
+the calibration medians; they never tighten, since the simulated latency does not speed up.
+Re-record the baseline after an intended change.
+
+Usage (from backend/):
+    python -m benchmarks.bench_core                      # run and compare to baseline.json
+    python -m benchmarks.bench_core --update-baseline    # record a new baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+import httpx
+
+from benchmarks.network import NetworkSpec, generate_network
+from db.memory_cache import MemoryRedis
+from db.sqlite_repository import SQLiteRepository
+
+# Workload of calibrate(): three days of the small network (300 flights, a few ms per round)
+CALIBRATION_SPEC = NetworkSpec(airports=10, hubs=2, flights_per_day=100, days=3)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+SIZES: Dict[str, NetworkSpec] = {
+    "small": NetworkSpec(airports=10, hubs=2, flights_per_day=100),
+    "medium": NetworkSpec(airports=20, hubs=3, flights_per_day=1000),
+    "large": NetworkSpec(airports=40, hubs=4, flights_per_day=5000),
+}
+
+
+class Delayed:
+    """Proxy that sleeps before every coroutine call of the wrapped store."""
+
+    def __init__(self, inner, delay_s: float):
+        self._inner = inner
+        self._delay_s = delay_s
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            if self._delay_s:
+                await asyncio.sleep(self._delay_s)
+            return await attr(*args, **kwargs)
+        return call
+
+
+def summarize(latencies_ms: List[float]) -> dict:
+    values = sorted(latencies_ms)
+    return {
+        "ops": len(values),
+        "median_ms": round(statistics.median(values), 3),
+        "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+async def _timed(coro) -> Tuple[float, httpx.Response]:
+    start = time.perf_counter()
+    response = await coro
+    return (time.perf_counter() - start) * 1000, response
+
+
+async def bench_route_search(client, spec: NetworkSpec, iterations: int, rng: random.Random) -> dict:
+    latencies, routes = [], 0
+    for _ in range(iterations):
+        origin, destination = rng.sample(spec.airport_codes, 2)
+        day = spec.start_date + timedelta(days=rng.randrange(spec.days))
+        ms, res = await _timed(client.get("/route", params={
+            "origin": origin, "destination": destination, "date": day.isoformat()
+        }))
+        res.raise_for_status()
+        latencies.append(ms)
+        routes += len(res.json())
+    return {**summarize(latencies), "routes_per_search": round(routes / iterations, 2)}
+
+
+async def bench_capacity_contention(client, repo: SQLiteRepository, flight: dict, concurrency: int) -> dict:
+    weight = 20
+    # 100kg left: every request lands in the critical (locked) zone and only 5 fit
+    room = 100
+    start_booked = flight["max_weight_kg"] - room
+    await repo.update_flight_booked_weight(flight["flight_id"], start_booked)
+
+    async def book(i: int):
+        return await _timed(client.post("/bookings", json={
+            "ref_id": f"BENCH-{flight['flight_id']}-{i}-{time.perf_counter_ns()}",
+            "origin": flight["origin"],
+            "destination": flight["destination"],
+            "pieces": 1,
+            "weight_kg": weight,
+            "flight_ids": [flight["flight_id"]],
+        }))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(book(i) for i in range(concurrency)))
+    wall_s = time.perf_counter() - started
+
+    codes: Dict[str, int] = {}
+    for _, res in results:
+        codes[str(res.status_code)] = codes.get(str(res.status_code), 0) + 1
+    booked = (await repo.get_flight(flight["flight_id"], columns="booked_weight_kg"))["booked_weight_kg"]
+    return {
+        **summarize([ms for ms, _ in results]),
+        "throughput_rps": round(concurrency / wall_s, 2),
+        "status_codes": codes,
+        "overbooked": booked > flight["max_weight_kg"],
+        "lost_updates": codes.get("200", 0) - (booked - start_booked) // weight,
+    }
+
+
+async def bench_timeline_read(client, repo: SQLiteRepository, user_id: str, iterations: int,
+                              events_per_booking: int, rng: random.Random) -> dict:
+    ref_ids = []
+    now = datetime.now(timezone.utc)
+    for b in range(50):
+        ref_id = f"TIMELINE-{b}"
+        await repo.insert_booking({
+            "ref_id": ref_id, "user_id": user_id, "origin": "DEL", "destination": "BOM",
+            "pieces": 1, "weight_kg": 10, "status": "BOOKED", "flight_ids": [],
+            "created_at": now, "updated_at": now,
+        })
+        for e in range(events_per_booking):
+            await repo.insert_booking_event({
+                "booking_ref_id": ref_id, "status": "DEPARTED", "location": "DEL",
+                "timestamp": now + timedelta(minutes=e),
+            })
+        ref_ids.append(ref_id)
+
+    latencies = []
+    for _ in range(iterations):
+        ms, res = await _timed(client.get(f"/bookings/{rng.choice(ref_ids)}"))
+        res.raise_for_status()
+        latencies.append(ms)
+    return summarize(latencies)
+
+
+async def run_size(name: str, spec: NetworkSpec, args: argparse.Namespace) -> dict:
+    from main import app, get_current_user
+    from db.repository import get_repository
+    from db.clients import get_redis
+
+    rng = random.Random(spec.seed)
+    repo = SQLiteRepository(":memory:")
+    flights = generate_network(spec)
+    seed_start = time.perf_counter()
+    await repo.insert_flights(flights)
+    seed_s = time.perf_counter() - seed_start
+    user = await repo.insert_user({"email": "bench@example.com", "password": "x", "name": "Bench"})
+
+    delay_s = args.store_latency_ms / 1000
+    delayed_repo = Delayed(repo, delay_s)
+    lock_cache = Delayed(MemoryRedis(), delay_s)
+
+    # Async providers, like the real ones: resolved on the loop, no threadpool hop
+    async def provide_repo():
+        return delayed_repo
+
+    async def provide_user():
+        return user
+
+    async def provide_fresh_cache():
+        return Delayed(MemoryRedis(), delay_s)
+
+    async def provide_lock_cache():
+        return lock_cache
+
+    app.dependency_overrides[get_repository] = provide_repo
+    app.dependency_overrides[get_current_user] = provide_user
+
+    results = {"flights": len(flights), "seed_s": round(seed_s, 3)}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Fresh cache per request keeps route search cold
+            app.dependency_overrides[get_redis] = provide_fresh_cache
+            results["route_search"] = await bench_route_search(client, spec, args.iterations, rng)
+
+            app.dependency_overrides[get_redis] = provide_lock_cache
+            results["capacity_contention"] = await bench_capacity_contention(
+                client, repo, rng.choice(flights), args.concurrency
+            )
+            results["timeline_read"] = await bench_timeline_read(
+                client, repo, user["id"], args.iterations, args.events_per_booking, rng
+            )
+    finally:
+        app.dependency_overrides.clear()
+        repo.close()
+    return results
+
+
+def calibrate(rounds: int = 30) -> dict:
+    """Times a fixed CPU workload shaped like the app's (validate, serialize, sort flight rows)."""
+    from models import Flight
+
+    rows = generate_network(CALIBRATION_SPEC)
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        flights = [Flight.model_validate(row) for row in rows]
+        payload = json.dumps([f.model_dump(mode="json") for f in flights])
+        sorted(json.loads(payload), key=lambda f: (f["origin"], f["departure_datetime"]))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+
+def machine_factor(results: dict, baseline: dict) -> float:
+    """How much slower this machine is than the baseline's (calibration median ratio, at least 1)."""
+    current = results.get("calibration", {}).get("median_ms")
+    reference = baseline.get("calibration", {}).get("median_ms")
+    if not current or not reference:
+        return 1.0
+    return max(1.0, current / reference)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Returns the scenarios whose median is more than `tolerance` slower than the baseline,
+    after widening the baseline by `machine_factor`.
+    """
+    factor = machine_factor(results, baseline)
+    regressions = []
+    for size, scenarios in results.items():
+        if size == "calibration":
+            continue
+        for scenario, current in scenarios.items():
+            if not isinstance(current, dict) or "median_ms" not in current:
+                continue
+            reference = baseline.get(size, {}).get(scenario, {}).get("median_ms")
+            if reference is None:
+                continue
+            limit = reference * factor * (1 + tolerance)
+            if current["median_ms"] > limit:
+                regressions.append(
+                    f"{size}/{scenario}: median {current['median_ms']}ms > {limit:.3f}ms "
+                    f"(baseline {reference}ms x {factor:.2f} machine factor + {tolerance:.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="small,medium", help=f"Comma-separated, from: {', '.join(SIZES)}")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent bookings in capacity_contention")
+    parser.add_argument("--events-per-booking", type=int, default=5)
+    parser.add_argument("--store-latency-ms", type=float, default=1.0, help="Simulated latency per storage/cache call")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown vs baseline median (0.5 = +50%%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Also write the results JSON here")
+    args = parser.parse_args()
+
+    results = {"calibration": calibrate()}
+    for name in args.sizes.split(","):
+        name = name.strip()
+        if name not in SIZES:
+            parser.error(f"Unknown size: {name}")
+        results[name] = asyncio.run(run_size(name, SIZES[name], args))
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found, skipping regression check", file=sys.stderr)
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("Performance regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+    print("No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
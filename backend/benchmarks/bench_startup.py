@@ -0,0 +1,155 @@
+"""
+Cold-start benchmark: how long a fresh process takes to import the app and serve
+its first requests, the cost a serverless deploy pays on every cold start.
+
+Each run starts a new interpreter that imports `main`, then sends GET /health and
+GET /route through the ASGI app (no server, no lifespan, like a serverless handler),
+with STORAGE_BACKEND=sqlite and CACHE_BACKEND=memory so no network is involved.
+
+Telemetry configurations:
+    noop           no exporter configured (the default)
+    otlp_sampled   OTLP exporters, parentbased_traceidratio at 10%
+    otlp_full      OTLP exporters, every trace sampled
+
+Lifespan configurations run the app's lifespan startup first (`lifespan_ms`) with the
+Supabase/Upstash backends pointed at a closed local port, then send GET /health only:
+    lifespan_lazy     warm-up connections 0 (serverless): no client is created at startup
+    lifespan_warmup   default warm-up: both clients (and the supabase SDK) are loaded at startup
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --app-dir /path/to/other/checkout/backend   # compare builds
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nothing listens there; the process exits before any export is attempted
+OTLP_ENDPOINT = "http://127.0.0.1:4318/v1/traces"
+
+CONFIGS: Dict[str, Dict[str, str]] = {
+    "noop": {},
+    "otlp_sampled": {
+        "OTEL_EXPORTER_OTLP_ENDPOINT": OTLP_ENDPOINT,
+        "OTEL_TRACES_SAMPLER": "parentbased_traceidratio",
+        "OTEL_TRACES_SAMPLER_ARG": "0.1",
+    },
+    "otlp_full": {"OTEL_EXPORTER_OTLP_ENDPOINT": OTLP_ENDPOINT},
+}
+
+# Remote backends on a closed port: warm-up pings fail at once, nothing is sent anywhere
+CLOSED_PORT_URL = "http://127.0.0.1:9"
+REMOTE_BACKENDS = {
+    "BENCH_LIFESPAN": "1",
+    "STORAGE_BACKEND": "supabase",
+    "CACHE_BACKEND": "upstash",
+    "SUPABASE_URL": CLOSED_PORT_URL,
+    "SUPABASE_KEY": "bench",
+    "UPSTASH_REDIS_REST_URL": CLOSED_PORT_URL,
+    "UPSTASH_REDIS_REST_TOKEN": "bench",
+}
+CONFIGS["lifespan_lazy"] = {
+    **REMOTE_BACKENDS, "SUPABASE_HTTP_WARMUP_CONNECTIONS": "0", "REDIS_HTTP_WARMUP_CONNECTIONS": "0",
+}
+CONFIGS["lifespan_warmup"] = REMOTE_BACKENDS
+
+CHILD = r"""
+import time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+import asyncio, json, os, httpx
+
+async def send(timings, paths):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        for name, path in paths:
+            start = time.perf_counter()
+            res = await client.get(path, params={"origin": "DEL", "destination": "BOM", "date": "2024-01-20"})
+            res.raise_for_status()
+            timings[name] = (time.perf_counter() - start) * 1000
+
+async def requests():
+    timings = {}
+    if not os.getenv("BENCH_LIFESPAN"):
+        await send(timings, (("first_request_ms", "/health"), ("first_route_ms", "/route"), ("warm_route_ms", "/route")))
+        return timings
+    start = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        timings["lifespan_ms"] = (time.perf_counter() - start) * 1000
+        await send(timings, (("first_request_ms", "/health"),))
+    return timings
+
+timings = asyncio.run(requests())
+print(json.dumps({"import_ms": (imported - started) * 1000, **timings}), flush=True)
+# Skip exporter flushes at shutdown
+os._exit(0)
+"""
+
+
+def run_once(app_dir: str, overrides: Dict[str, str], sqlite_path: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if not k.startswith("OTEL_")}
+    env.update({
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": sqlite_path,
+        "CACHE_BACKEND": "memory",
+        "PYTHONDONTWRITEBYTECODE": "1",
+        **overrides,
+    })
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=app_dir, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs: List[dict]) -> dict:
+    return {
+        metric: {
+            "median": round(statistics.median(r[metric] for r in runs), 2),
+            "min": round(min(r[metric] for r in runs), 2),
+        }
+        for metric in runs[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per configuration")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"Comma-separated, from: {', '.join(CONFIGS)}")
+    parser.add_argument("--app-dir", default=BACKEND_DIR, help="backend/ directory of the build to measure")
+    parser.add_argument("--output", help="Also write the results JSON here")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.configs.split(","):
+            name = name.strip()
+            if name not in CONFIGS:
+                parser.error(f"Unknown config: {name}")
+            # One warm-up run so every measured run sees the same OS file cache
+            run_once(args.app_dir, CONFIGS[name], os.path.join(tmp, f"{name}-warmup.sqlite3"))
+            runs = [
+                run_once(args.app_dir, CONFIGS[name], os.path.join(tmp, f"{name}-{i}.sqlite3"))
+                for i in range(args.runs)
+            ]
+            results[name] = summarize(runs)
+            print(f"{name}: {results[name]}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Seeded synthetic flight-network generator for benchmarks and local load tests.
+
+The network is hub-and-spoke: the first `hubs` airports are hubs, and
+`hub_share` of the flights start or end at a hub; the rest fly between random
+airport pairs. Booked weight follows a normal load factor around `load_factor`.
+The same spec and seed always give the same flights.
+"""
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from pydantic import BaseModel
+
+# Hubs first: the first `hubs` codes of a spec become its hubs
+AIRPORT_CODES = [
+    "DEL", "BOM", "DXB", "SIN", "LHR", "FRA", "HKG", "DOH", "AMS", "CDG",
+    "BLR", "MAA", "CCU", "HYD", "AMD", "COK", "PNQ", "GOI", "JAI", "LKO",
+    "ATQ", "IXC", "BBI", "GAU", "NAG", "TRV", "VNS", "PAT", "IXB", "SXR",
+    "JFK", "ORD", "LAX", "MIA", "YYZ", "GRU", "JNB", "NBO", "CAI", "IST",
+    "MUC", "ZRH", "MAD", "FCO", "BRU", "CPH", "ARN", "HEL", "WAW", "VIE",
+    "NRT", "ICN", "PVG", "PEK", "BKK", "KUL", "CGK", "MNL", "SYD", "MEL",
+]
+AIRLINES = ["Air India", "IndiGo", "Emirates", "Singapore Airlines", "Lufthansa", "Qatar Airways", "British Airways"]
+
+
+class NetworkSpec(BaseModel):
+    airports: int = 20
+    hubs: int = 3
+    hub_share: float = 0.7
+    days: int = 7
+    flights_per_day: int = 500
+    load_factor: float = 0.6
+    load_factor_sd: float = 0.2
+    max_weight_kg: int = 5000
+    start_date: date = date(2024, 1, 20)
+    seed: int = 42
+
+    @property
+    def airport_codes(self) -> List[str]:
+        return AIRPORT_CODES[:self.airports]
+
+
+def generate_network(spec: NetworkSpec) -> List[dict]:
+    """Returns flight rows shaped like the `flights` table."""
+    if not 2 <= spec.airports <= len(AIRPORT_CODES):
+        raise ValueError(f"airports must be between 2 and {len(AIRPORT_CODES)}")
+    rng = random.Random(spec.seed)
+    codes = spec.airport_codes
+    hubs = codes[:max(1, min(spec.hubs, len(codes) - 1))]
+
+    flights = []
+    for d in range(spec.days):
+        day = datetime.combine(spec.start_date + timedelta(days=d), datetime.min.time()).replace(tzinfo=timezone.utc)
+        for n in range(spec.flights_per_day):
+            if rng.random() < spec.hub_share:
+                hub = rng.choice(hubs)
+                other = rng.choice([c for c in codes if c != hub])
+                origin, destination = (hub, other) if rng.random() < 0.5 else (other, hub)
+            else:
+                origin, destination = rng.sample(codes, 2)
+
+            departure = day + timedelta(minutes=rng.randrange(0, 24 * 60, 5))
+            load = min(1.0, max(0.0, rng.gauss(spec.load_factor, spec.load_factor_sd)))
+            airline = rng.choice(AIRLINES)
+            flights.append({
+                "flight_id": f"SYN-{spec.seed}-{d:03d}-{n:05d}",
+                "flight_number": f"{airline[:2].upper()}{rng.randrange(100, 9999)}",
+                "airline_name": airline,
+                "departure_datetime": departure,
+                "arrival_datetime": departure + timedelta(minutes=rng.randrange(60, 10 * 60, 5)),
+                "origin": origin,
+                "destination": destination,
+                "max_weight_kg": spec.max_weight_kg,
+                "booked_weight_kg": int(load * spec.max_weight_kg) // 10 * 10,
+                "base_price_per_kg": round(rng.uniform(3, 15), 2),
+            })
+    return flights
@@ -0,0 +1,115 @@
+"""
+Response compression negotiated from Accept-Encoding: brotli when the `brotli`
+package is installed and the client accepts it, otherwise gzip.
+
+Builds on Starlette's GZip responders (size threshold, Vary header, already-encoded
+and event-stream responses left alone). Streamed bodies are flushed chunk by chunk
+so progress streams are not held back by the compressor. Compressed responses get
+their strong ETag suffixed with the coding (`conditional.coded_etag`).
+"""
+import zlib
+from typing import Dict
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from conditional import coded_etag
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+class FlushingGZipResponder(GZipResponder):
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            self.gzip_file.write(body)
+            self.gzip_file.flush(zlib.Z_SYNC_FLUSH)
+            body = self.gzip_buffer.getvalue()
+            self.gzip_buffer.seek(0)
+            self.gzip_buffer.truncate()
+            return body
+        return super().apply_compression(body, more_body=more_body)
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if more_body:
+            return self.compressor.process(body) + self.compressor.flush()
+        return self.compressor.process(body) + self.compressor.finish()
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parses Accept-Encoding into {coding: q}."""
+    encodings = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        encodings[coding.strip().lower()] = q
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes. Levels favour CPU over
+    ratio (gzip 6, brotli 4), which suits small, frequently polled JSON.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        encodings = accepted_encodings(accept_encoding)
+        candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+        wildcard = encodings.get("*", 0.0)
+        best, best_q = "identity", 0.0
+        for coding in candidates:
+            q = encodings.get(coding, wildcard)
+            # Earlier candidates win ties, so br is preferred over gzip
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif encoding == "gzip":
+            responder = FlushingGZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            await IdentityResponder(self.app, self.minimum_size)(scope, receive, send)
+            return
+
+        async def send_with_coded_etag(message: Message) -> None:
+            # Headers are final once the responder sends the start message
+            if message["type"] == "http.response.start" and not responder.content_encoding_set:
+                headers = MutableHeaders(raw=message["headers"])
+                if headers.get("content-encoding") == encoding and "etag" in headers:
+                    headers["ETag"] = coded_etag(headers["etag"], encoding)
+            await send(message)
+
+        await responder(scope, receive, send_with_coded_etag)
@@ -0,0 +1,69 @@
+"""
+Conditional GET helpers: strong ETags and If-None-Match handling.
+"""
+import hashlib
+from typing import Optional, Union
+
+from fastapi import Request, Response
+
+# Content-codings of CompressionMiddleware, which tags strong ETags with them
+CODINGS = ("gzip", "br")
+
+
+def make_etag(*parts: Union[str, bytes]) -> str:
+    """Strong ETag (quoted) from a content version: the cached payload itself or version fields."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def coded_etag(etag: str, coding: str) -> str:
+    """
+    The strong ETag of the `coding`-encoded representation ("abc" -> "abc-gzip"): a strong tag
+    must differ between content-codings. Weak tags already allow that and are returned as is.
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def _base_etag(tag: str) -> str:
+    """A tag without its W/ prefix and content-coding suffix, comparable to `make_etag` output."""
+    tag = tag.removeprefix("W/")
+    for coding in CODINGS:
+        suffix = f'-{coding}"'
+        if tag.endswith(suffix):
+            return f'{tag[:-len(suffix)]}"'
+    return tag
+
+
+def _matching_tag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    # The client's tag (W/ removed) that matches `etag`
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if _base_etag(tag) == etag:
+            return tag
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match uses weak comparison, so a W/ prefix on the client's tag is ignored, and
+    so is the content-coding suffix the compression middleware adds (see `coded_etag`).
+    """
+    return _matching_tag(if_none_match, etag) is not None
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """The 304 response when the client already holds `etag`, otherwise None."""
+    matched = _matching_tag(request.headers.get("if-none-match"), etag)
+    if matched is not None:
+        # Echo the tag of the representation the client holds (e.g. its gzip variant)
+        return Response(status_code=304, headers={"ETag": matched})
+    return None
@@ -0,0 +1,313 @@
+import asyncio
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Protocol
+
+import httpx
+from dotenv import load_dotenv
+
+from env_settings import EnvSettings
+from resilience import ResilientStore
+from telemetry import InstrumentedStore
+
+if TYPE_CHECKING:
+    # The SDKs are imported on first use: supabase alone adds ~0.5s to a cold start
+    from supabase import AsyncClient
+    from upstash_redis.asyncio import Redis
+
+load_dotenv()
+
+
+class PoolSettings(EnvSettings):
+    """
+    Connection pool and timeout settings for one upstream.
+    Every field can be overridden with `<PREFIX><FIELD>`, e.g. SUPABASE_HTTP_MAX_CONNECTIONS=100.
+    """
+    max_connections: int = 50
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 10.0
+    write_timeout: float = 10.0
+    pool_timeout: float = 5.0
+    http2: bool = False
+    # Connections opened at startup so the first requests skip the TLS handshake
+    warmup_connections: int = 4
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+
+class PoolStats:
+    """Thread-safe counters for a pooled client: requests, new connections and pool wait."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.connections_opened = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def request_started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "connections_opened": self.connections_opened,
+                "pool_wait_avg_ms": round(self.wait_total_s / self.requests * 1000, 3) if self.requests else 0.0,
+                "pool_wait_max_ms": round(self.wait_max_s * 1000, 3),
+            }
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """
+    HTTP transport that records pool statistics.
+    Pool wait is the time between handing the request to the pool and the request
+    getting a connection: either a new TCP connect starts or headers go out on a reused one.
+    """
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        acquired = False
+        parent_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict):
+            nonlocal acquired
+            if event_name == "connection.connect_tcp.started":
+                self.stats.connection_opened()
+            if not acquired and (
+                event_name == "connection.connect_tcp.started"
+                or event_name.endswith("send_request_headers.started")
+            ):
+                acquired = True
+                self.stats.record_wait(time.perf_counter() - start)
+            if parent_trace is not None:
+                await parent_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self.stats.request_started()
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            self.stats.request_finished()
+
+    def pool_usage(self) -> dict:
+        connections = self._pool.connections
+        return {
+            "open_connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+        }
+
+
+class PooledHTTPClient:
+    """An httpx.AsyncClient with configured limits/timeouts plus its stats."""
+
+    def __init__(self, settings: PoolSettings, headers: Optional[dict] = None, event_hooks: Optional[dict] = None):
+        self.settings = settings
+        self.stats = PoolStats()
+        self.transport = InstrumentedTransport(
+            self.stats,
+            limits=settings.limits(),
+            http2=settings.http2,
+        )
+        self.http = httpx.AsyncClient(
+            transport=self.transport,
+            timeout=settings.timeout(),
+            headers=headers,
+            event_hooks=event_hooks,
+        )
+
+    async def warm_up(self, url: str):
+        """Opens up to `warmup_connections` connections in parallel. Errors are reported, not raised."""
+        count = min(self.settings.warmup_connections, self.settings.max_keepalive_connections)
+        if count <= 0:
+            return
+
+        async def ping():
+            try:
+                await self.http.head(url)
+            except httpx.HTTPError as e:
+                print(f"Connection warm-up failed for {url}: {e}")
+
+        await asyncio.gather(*(ping() for _ in range(count)))
+
+    def usage(self) -> dict:
+        return {**self.stats.snapshot(), **self.transport.pool_usage(), "max_connections": self.settings.max_connections}
+
+    async def close(self):
+        await self.http.aclose()
+
+
+async def raise_for_server_error(response: httpx.Response) -> None:
+    """
+    Response hook for the Upstash pool: 5xx answers raise httpx.HTTPStatusError. upstash-redis
+    would raise their JSON body as a plain UpstashError, losing the status that tells the
+    circuit breaker the cache is unhealthy (see resilience.is_failure).
+    """
+    if response.status_code >= 500:
+        response.raise_for_status()
+
+
+def use_pooled_client(redis: "Redis", http: httpx.AsyncClient) -> httpx.AsyncClient:
+    """
+    Points an Upstash client at a pooled httpx client and returns the client it replaced.
+    upstash-redis does not accept an httpx client, so this sets the private
+    `_http._client` of the versions pinned in pyproject.toml (1.5.x); it fails loudly
+    if an upgrade moves it instead of silently keeping the unpooled client.
+    """
+    original = getattr(getattr(redis, "_http", None), "_client", None)
+    if not isinstance(original, httpx.AsyncClient):
+        raise RuntimeError(
+            "upstash_redis internals changed (no Redis._http._client httpx.AsyncClient), "
+            "update use_pooled_client for the installed version"
+        )
+    redis._http._client = http
+    return original
+
+
+class ClientManager:
+    """
+    Owns the Supabase and Upstash clients and their HTTP pools.
+    Clients are created on first use; `start()` (called from the FastAPI lifespan)
+    creates them up-front and warms the pools, `close()` releases the sockets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._supabase: Optional["AsyncClient"] = None
+        self._redis: Optional["Redis"] = None
+        self._pools: Dict[str, PooledHTTPClient] = {}
+        # SDK-created httpx clients replaced by pooled ones, closed with the pools
+        self._replaced_clients: List[httpx.AsyncClient] = []
+
+    @property
+    def supabase(self) -> "AsyncClient":
+        if self._supabase is None:
+            with self._lock:
+                if self._supabase is None:
+                    from supabase import AsyncClient
+                    from supabase.lib.client_options import AsyncClientOptions
+
+                    pool = PooledHTTPClient(PoolSettings.from_env("SUPABASE_HTTP_"))
+                    options = AsyncClientOptions(httpx_client=pool.http)
+                    self._supabase = AsyncClient(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"), options)
+                    self._pools["supabase"] = pool
+        return self._supabase
+
+    @property
+    def redis(self) -> "Redis":
+        if self._redis is None:
+            with self._lock:
+                if self._redis is None:
+                    from upstash_redis.asyncio import Redis
+
+                    pool = PooledHTTPClient(
+                        PoolSettings.from_env("REDIS_HTTP_"), event_hooks={"response": [raise_for_server_error]}
+                    )
+                    redis = Redis(
+                        url=os.getenv("UPSTASH_REDIS_REST_URL"),
+                        token=os.getenv("UPSTASH_REDIS_REST_TOKEN"),
+                        rest_retries=int(os.getenv("UPSTASH_REST_RETRIES", "1")),
+                        rest_retry_interval=float(os.getenv("UPSTASH_REST_RETRY_INTERVAL", "0.1")),
+                    )
+                    self._replaced_clients.append(use_pooled_client(redis, pool.http))
+                    self._redis = redis
+                    self._pools["redis"] = pool
+        return self._redis
+
+    async def start(self, supabase: bool = True, redis: bool = True):
+        """
+        Creates the configured clients and pre-opens their connections. A client whose
+        `<PREFIX>WARMUP_CONNECTIONS` is 0 is left to be created on first use (serverless).
+        """
+        warmups = []
+        if supabase and os.getenv("SUPABASE_URL") and PoolSettings.from_env("SUPABASE_HTTP_").warmup_connections > 0:
+            self.supabase
+            warmups.append((self._pools["supabase"], os.environ["SUPABASE_URL"]))
+        if redis and os.getenv("UPSTASH_REDIS_REST_URL") and PoolSettings.from_env("REDIS_HTTP_").warmup_connections > 0:
+            self.redis
+            warmups.append((self._pools["redis"], os.environ["UPSTASH_REDIS_REST_URL"]))
+        await asyncio.gather(*(pool.warm_up(url) for pool, url in warmups))
+
+    def stats(self) -> dict:
+        return {name: pool.usage() for name, pool in self._pools.items()}
+
+    async def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+            replaced, self._replaced_clients = self._replaced_clients, []
+            self._supabase = None
+            self._redis = None
+        for pool in pools.values():
+            await pool.close()
+        for client in replaced:
+            await client.aclose()
+
+
+clients = ClientManager()
+
+
+class Cache(Protocol):
+    """The cache/lock commands the API uses, as served by Upstash and `MemoryRedis`."""
+
+    async def get(self, key: str) -> Any: ...
+
+    async def set(self, key: str, value: Any, nx: bool = False, ex: Optional[int] = None,
+                  px: Optional[int] = None) -> Any: ...
+
+    async def delete(self, *keys: str) -> int: ...
+
+    async def sadd(self, key: str, *members: str) -> int: ...
+
+    async def smembers(self, key: str) -> Any: ...
+
+    async def expire(self, key: str, seconds: int) -> Any: ...
+
+
+async def get_redis() -> Cache:
+    """
+    FastAPI dependency for the cache/lock client.
+    CACHE_BACKEND selects it: "upstash" (default, pooled REST client) or "memory" (in-process).
+    Upstash calls go through the "redis" circuit breaker and a short per-call timeout.
+    Async like get_repository, so resolving it needs no threadpool token.
+    """
+    if os.getenv("CACHE_BACKEND", "upstash").lower() == "memory":
+        from db.memory_cache import memory_cache
+        return InstrumentedStore(memory_cache, "memory")
+    return ResilientStore(InstrumentedStore(clients.redis, "redis"), "redis")
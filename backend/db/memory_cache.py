@@ -0,0 +1,75 @@
+import time
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+
+class MemoryRedis:
+    """
+    In-process stand-in for the async Upstash client, covering the commands the
+    API uses (get, set with TTL and NX, delete, sadd, smembers, expire). Used for local runs,
+    load tests and benchmarks (CACHE_BACKEND=memory); state is per process.
+    """
+
+    def __init__(self):
+        # key -> (value, expires_at or None); values are strings or, for set keys, sets
+        self._data: Dict[str, Tuple[Union[str, Set[str]], Optional[float]]] = {}
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+
+    async def set(
+        self,
+        key: str,
+        value,
+        nx: bool = False,
+        ex: Optional[int] = None,
+        px: Optional[int] = None,
+    ) -> Optional[str]:
+        if nx and self._live(key) is not None:
+            return None
+        expires_at = None
+        if ex is not None:
+            expires_at = time.monotonic() + ex
+        elif px is not None:
+            expires_at = time.monotonic() + px / 1000
+        self._data[key] = (str(value), expires_at)
+        return "OK"
+
+    async def delete(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._live(key) is not None:
+                del self._data[key]
+                removed += 1
+        return removed
+
+    async def sadd(self, key: str, *members: str) -> int:
+        current = self._live(key)
+        if current is None:
+            current = set()
+            self._data[key] = (current, None)
+        added = len(set(members) - current)
+        current.update(members)
+        return added
+
+    async def smembers(self, key: str) -> List[str]:
+        return list(self._live(key) or ())
+
+    async def expire(self, key: str, seconds: int) -> int:
+        value = self._live(key)
+        if value is None:
+            return 0
+        self._data[key] = (value, time.monotonic() + seconds)
+        return 1
+
+
+memory_cache = MemoryRedis()
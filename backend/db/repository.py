@@ -0,0 +1,128 @@
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Optional
+
+from resilience import ResilientStore
+from telemetry import InstrumentedStore
+
+
+class Repository(ABC):
+    """
+    Async storage interface for flights, bookings, booking_events and users.
+    Rows go in and come out as plain dicts shaped like the Supabase tables,
+    so the API layer can keep building its Pydantic models from them.
+    """
+
+    # --- Flights ---
+
+    @abstractmethod
+    async def get_flight(self, flight_id: str, columns: str = "*") -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def search_flights(
+        self,
+        origin: str,
+        departure_from: datetime,
+        departure_to: datetime,
+        destination: Optional[str] = None,
+    ) -> List[dict]:
+        """Flights leaving `origin` (optionally to `destination`) within the departure window."""
+        ...
+
+    @abstractmethod
+    async def list_flights_departing(
+        self,
+        departure_from: datetime,
+        departure_to: datetime,
+        columns: str = "*",
+    ) -> List[dict]:
+        """All flights departing within the window, in departure order (unpaged)."""
+        ...
+
+    @abstractmethod
+    async def update_flight_booked_weight(self, flight_id: str, booked_weight_kg: int) -> None:
+        ...
+
+    @abstractmethod
+    async def list_flights(self, flight_ids: List[str], columns: str = "*") -> List[dict]:
+        """Flights with the given ids; unknown ids are left out."""
+        ...
+
+    @abstractmethod
+    async def upsert_flights(self, flights: List[dict]) -> None:
+        """
+        Inserts or updates flights keyed by flight_id. Only the given columns are written,
+        so leaving out booked_weight_kg keeps the booked weight of existing flights.
+        """
+        ...
+
+    # --- Bookings ---
+
+    @abstractmethod
+    async def get_booking(self, ref_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def list_user_bookings(self, user_id: str) -> List[dict]:
+        """Bookings of a user, newest first."""
+        ...
+
+    @abstractmethod
+    async def insert_booking(self, booking: dict) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def update_booking_status(self, ref_id: str, status: str, updated_at: str) -> None:
+        ...
+
+    # --- Booking Events ---
+
+    @abstractmethod
+    async def insert_booking_event(self, event: dict) -> None:
+        ...
+
+    @abstractmethod
+    async def list_booking_events(self, ref_id: str) -> List[dict]:
+        """Events of a booking in timestamp order."""
+        ...
+
+    # --- Users ---
+
+    @abstractmethod
+    async def get_user_by_email(self, email: str, columns: str = "*") -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def insert_user(self, user: dict) -> Optional[dict]:
+        ...
+
+
+_sqlite_repository: Optional[Repository] = None
+
+
+async def get_repository() -> Repository:
+    """
+    Returns the repository for the configured engine, traced per call.
+    STORAGE_BACKEND selects it: "supabase" (default) or "sqlite".
+    Supabase calls also go through its circuit breaker and the request deadline.
+    Async so FastAPI resolves it on the event loop instead of a threadpool hop per request.
+    """
+    global _sqlite_repository
+    backend = os.getenv("STORAGE_BACKEND", "supabase").lower()
+    if backend == "sqlite":
+        if _sqlite_repository is None:
+            from db.sqlite_repository import SQLiteRepository
+            _sqlite_repository = InstrumentedStore(
+                SQLiteRepository(os.getenv("SQLITE_PATH", "gocomet.sqlite3")), "sqlite", counts_as_query=True
+            )
+        return _sqlite_repository
+    if backend == "supabase":
+        from db.clients import clients
+        from db.supabase_repository import SupabaseRepository
+        # Thin wrapper over the shared, pooled client
+        return ResilientStore(
+            InstrumentedStore(SupabaseRepository(clients.supabase), "supabase", counts_as_query=True), "supabase"
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
@@ -0,0 +1,336 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, List, Optional
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+
+from db.repository import Repository
+
+# Mirrors the Supabase tables. Timestamps are stored as normalized UTC ISO strings
+# so that range filters on the indexed columns are plain string comparisons.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    name TEXT NOT NULL,
+    dob TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS flights (
+    flight_id TEXT PRIMARY KEY,
+    flight_number TEXT NOT NULL,
+    airline_name TEXT NOT NULL,
+    departure_datetime TEXT NOT NULL,
+    arrival_datetime TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    max_weight_kg INTEGER NOT NULL DEFAULT 5000,
+    booked_weight_kg INTEGER NOT NULL DEFAULT 0,
+    base_price_per_kg REAL NOT NULL DEFAULT 5.0
+);
+CREATE INDEX IF NOT EXISTS idx_flights_origin_departure
+    ON flights (origin, departure_datetime);
+CREATE INDEX IF NOT EXISTS idx_flights_origin_destination_departure
+    ON flights (origin, destination, departure_datetime);
+CREATE INDEX IF NOT EXISTS idx_flights_departure
+    ON flights (departure_datetime);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    ref_id TEXT PRIMARY KEY,
+    user_id TEXT REFERENCES users (id),
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    pieces INTEGER NOT NULL,
+    weight_kg INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    flight_ids TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_user_created
+    ON bookings (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS booking_events (
+    id TEXT PRIMARY KEY,
+    booking_ref_id TEXT NOT NULL REFERENCES bookings (ref_id),
+    status TEXT NOT NULL,
+    location TEXT,
+    flight_id TEXT,
+    timestamp TEXT NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_booking_events_ref_timestamp
+    ON booking_events (booking_ref_id, timestamp);
+"""
+
+FLIGHT_COLUMNS = (
+    "flight_id", "flight_number", "airline_name", "departure_datetime", "arrival_datetime",
+    "origin", "destination", "max_weight_kg", "booked_weight_kg", "base_price_per_kg",
+)
+# Column defaults of the flights table, applied when a row leaves them out
+FLIGHT_DEFAULTS = {"max_weight_kg": 5000, "booked_weight_kg": 0, "base_price_per_kg": 5.0}
+BOOKING_COLUMNS = (
+    "ref_id", "user_id", "origin", "destination", "pieces", "weight_kg",
+    "status", "flight_ids", "created_at", "updated_at",
+)
+EVENT_COLUMNS = ("id", "booking_ref_id", "status", "location", "flight_id", "timestamp", "metadata")
+USER_COLUMNS = ("id", "email", "password", "name", "dob", "created_at")
+# Rows per lock hold of a chunked read (a few ms), see _fetch_chunked
+READ_CHUNK_ROWS = 1000
+
+
+def _timestamp(value: Any) -> Optional[str]:
+    """Normalizes a datetime or ISO string to UTC with a fixed layout (naive values are UTC)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+def _value(value: Any) -> Any:
+    # str-Enums (BookingStatus) are stored by value
+    return value.value if hasattr(value, "value") else value
+
+
+def _columns(columns: str, allowed: tuple) -> str:
+    if columns.strip() == "*":
+        return ", ".join(allowed)
+    names = [c.strip() for c in columns.split(",")]
+    unknown = [c for c in names if c not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    return ", ".join(names)
+
+
+class SQLiteRepository(Repository):
+    """
+    Embedded repository for single-node deployments, local runs and benchmarks.
+    Queries are indexed local lookups, so they run inline on the event loop; only the
+    departure range scan (analytics) runs in the threadpool. The one shared connection
+    is guarded by a lock for threaded callers; the scan takes it per chunk of rows, so an
+    inline call never waits on the loop for more than one chunk.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _fetchall(self, sql: str, params: tuple = ()) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(r) for r in rows]
+
+    def _fetch_chunked(self, sql: str, params: tuple = (), chunk_rows: int = READ_CHUNK_ROWS) -> List[dict]:
+        """Like _fetchall, but releases the lock between chunks of `chunk_rows` rows (for threadpool callers)."""
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchmany(chunk_rows)
+        result = []
+        while rows:
+            result.extend(dict(r) for r in rows)
+            with self._lock:
+                rows = cursor.fetchmany(chunk_rows)
+        return result
+
+    def _execute(self, sql: str, params: tuple = ()) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+
+    @staticmethod
+    def _booking_row(row: dict) -> dict:
+        if "flight_ids" in row:
+            row["flight_ids"] = json.loads(row["flight_ids"] or "[]")
+        return row
+
+    @staticmethod
+    def _event_row(row: dict) -> dict:
+        row["metadata"] = json.loads(row["metadata"]) if row.get("metadata") else {}
+        return row
+
+    # --- Flights ---
+
+    async def get_flight(self, flight_id: str, columns: str = "*") -> Optional[dict]:
+        rows = self._fetchall(
+            f"SELECT {_columns(columns, FLIGHT_COLUMNS)} FROM flights WHERE flight_id = ?",
+            (flight_id,),
+        )
+        return rows[0] if rows else None
+
+    async def search_flights(
+        self,
+        origin: str,
+        departure_from: datetime,
+        departure_to: datetime,
+        destination: Optional[str] = None,
+    ) -> List[dict]:
+        sql = f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights WHERE origin = ?"
+        params: tuple = (origin,)
+        if destination is not None:
+            sql += " AND destination = ?"
+            params += (destination,)
+        sql += " AND departure_datetime >= ? AND departure_datetime <= ? ORDER BY departure_datetime"
+        params += (_timestamp(departure_from), _timestamp(departure_to))
+        return self._fetchall(sql, params)
+
+    async def list_flights_departing(
+        self,
+        departure_from: datetime,
+        departure_to: datetime,
+        columns: str = "*",
+    ) -> List[dict]:
+        # A range can hold tens of thousands of flights, too long a read for the event loop
+        return await run_in_threadpool(
+            self._fetch_chunked,
+            f"SELECT {_columns(columns, FLIGHT_COLUMNS)} FROM flights "
+            "WHERE departure_datetime >= ? AND departure_datetime <= ? ORDER BY departure_datetime",
+            (_timestamp(departure_from), _timestamp(departure_to)),
+        )
+
+    async def update_flight_booked_weight(self, flight_id: str, booked_weight_kg: int) -> None:
+        self._execute("UPDATE flights SET booked_weight_kg = ? WHERE flight_id = ?", (booked_weight_kg, flight_id))
+
+    async def insert_flights(self, flights: List[dict]) -> None:
+        """Bulk-loads flight rows (used to seed local databases)."""
+        rows = [
+            tuple(
+                _timestamp(f[c]) if c.endswith("_datetime") else f.get(c, FLIGHT_DEFAULTS.get(c))
+                for c in FLIGHT_COLUMNS
+            )
+            for f in flights
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT INTO flights ({', '.join(FLIGHT_COLUMNS)}) VALUES ({', '.join('?' * len(FLIGHT_COLUMNS))})",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    async def list_flights(self, flight_ids: List[str], columns: str = "*") -> List[dict]:
+        rows = []
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(flight_ids), 500):
+            ids = flight_ids[i:i + 500]
+            rows += self._fetchall(
+                f"SELECT {_columns(columns, FLIGHT_COLUMNS)} FROM flights "
+                f"WHERE flight_id IN ({', '.join('?' * len(ids))})",
+                tuple(ids),
+            )
+        return rows
+
+    async def upsert_flights(self, flights: List[dict]) -> None:
+        if not flights:
+            return
+        columns = [c for c in FLIGHT_COLUMNS if c in flights[0]]
+        if "flight_id" not in columns:
+            raise ValueError("flight_id is required to upsert flights")
+        rows = [
+            tuple(_timestamp(f[c]) if c.endswith("_datetime") else f.get(c, FLIGHT_DEFAULTS.get(c)) for c in columns)
+            for f in flights
+        ]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "flight_id")
+        on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT INTO flights ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT (flight_id) {on_conflict}",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # --- Bookings ---
+
+    async def get_booking(self, ref_id: str) -> Optional[dict]:
+        rows = self._fetchall(f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings WHERE ref_id = ?", (ref_id,))
+        return self._booking_row(rows[0]) if rows else None
+
+    async def list_user_bookings(self, user_id: str) -> List[dict]:
+        rows = self._fetchall(
+            f"SELECT {', '.join(BOOKING_COLUMNS)} FROM bookings WHERE user_id = ? ORDER BY created_at DESC",
+            (user_id,),
+        )
+        return [self._booking_row(r) for r in rows]
+
+    async def insert_booking(self, booking: dict) -> Optional[dict]:
+        row = {c: _value(booking.get(c)) for c in BOOKING_COLUMNS}
+        row["flight_ids"] = json.dumps(booking.get("flight_ids") or [])
+        row["created_at"] = _timestamp(row["created_at"])
+        row["updated_at"] = _timestamp(row["updated_at"])
+        self._execute(
+            f"INSERT INTO bookings ({', '.join(BOOKING_COLUMNS)}) VALUES ({', '.join('?' * len(BOOKING_COLUMNS))})",
+            tuple(row.values()),
+        )
+        return await self.get_booking(row["ref_id"])
+
+    async def update_booking_status(self, ref_id: str, status: str, updated_at: str) -> None:
+        self._execute(
+            "UPDATE bookings SET status = ?, updated_at = ? WHERE ref_id = ?",
+            (_value(status), _timestamp(updated_at), ref_id),
+        )
+
+    # --- Booking Events ---
+
+    async def insert_booking_event(self, event: dict) -> None:
+        row = {c: _value(event.get(c)) for c in EVENT_COLUMNS}
+        row["id"] = row["id"] or str(uuid4())
+        row["timestamp"] = _timestamp(row["timestamp"] or datetime.now(timezone.utc))
+        row["metadata"] = json.dumps(row["metadata"]) if row["metadata"] is not None else None
+        self._execute(
+            f"INSERT INTO booking_events ({', '.join(EVENT_COLUMNS)}) VALUES ({', '.join('?' * len(EVENT_COLUMNS))})",
+            tuple(row.values()),
+        )
+
+    async def list_booking_events(self, ref_id: str) -> List[dict]:
+        rows = self._fetchall(
+            f"SELECT {', '.join(EVENT_COLUMNS)} FROM booking_events WHERE booking_ref_id = ? ORDER BY timestamp",
+            (ref_id,),
+        )
+        return [self._event_row(r) for r in rows]
+
+    # --- Users ---
+
+    async def get_user_by_email(self, email: str, columns: str = "*") -> Optional[dict]:
+        rows = self._fetchall(f"SELECT {_columns(columns, USER_COLUMNS)} FROM users WHERE email = ?", (email,))
+        return rows[0] if rows else None
+
+    async def insert_user(self, user: dict) -> Optional[dict]:
+        row = {c: user.get(c) for c in USER_COLUMNS}
+        row["id"] = row["id"] or str(uuid4())
+        row["created_at"] = _timestamp(row["created_at"] or datetime.now(timezone.utc))
+        try:
+            self._execute(
+                f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})",
+                tuple(row.values()),
+            )
+        except sqlite3.IntegrityError as e:
+            raise ValueError(str(e)) from e
+        return await self.get_user_by_email(row["email"])
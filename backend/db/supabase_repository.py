@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from supabase import AsyncClient
+
+from db.repository import Repository
+
+ID_FILTER_CHUNK = 200
+# PostgREST caps rows per response (max-rows, 1000 by default), so long lists are read in pages
+PAGE_SIZE = 1000
+
+
+class SupabaseRepository(Repository):
+    """Repository backed by the async Supabase (PostgREST) client."""
+
+    def __init__(self, client: AsyncClient):
+        self.client = client
+
+    # --- Flights ---
+
+    async def get_flight(self, flight_id: str, columns: str = "*") -> Optional[dict]:
+        res = await self.client.table("flights").select(columns).eq("flight_id", flight_id).execute()
+        return res.data[0] if res.data else None
+
+    async def search_flights(
+        self,
+        origin: str,
+        departure_from: datetime,
+        departure_to: datetime,
+        destination: Optional[str] = None,
+    ) -> List[dict]:
+        query = self.client.table("flights").select("*").eq("origin", origin)
+        if destination is not None:
+            query = query.eq("destination", destination)
+        res = await query\
+            .gte("departure_datetime", departure_from.isoformat())\
+            .lte("departure_datetime", departure_to.isoformat())\
+            .execute()
+        return res.data
+
+    async def list_flights_departing(
+        self,
+        departure_from: datetime,
+        departure_to: datetime,
+        columns: str = "*",
+    ) -> List[dict]:
+        def page(start: int, count=None):
+            return self.client.table("flights").select(columns, count=count)\
+                .gte("departure_datetime", departure_from.isoformat())\
+                .lte("departure_datetime", departure_to.isoformat())\
+                .order("departure_datetime").order("flight_id")\
+                .range(start, start + PAGE_SIZE - 1)\
+                .execute()
+
+        # The first page carries the total count, the remaining pages are fetched concurrently
+        first = await page(0, count="exact")
+        total = first.count or len(first.data)
+        rest = await asyncio.gather(*(page(start) for start in range(PAGE_SIZE, total, PAGE_SIZE)))
+        return first.data + [row for res in rest for row in res.data]
+
+    async def update_flight_booked_weight(self, flight_id: str, booked_weight_kg: int) -> None:
+        await self.client.table("flights").update({"booked_weight_kg": booked_weight_kg}).eq("flight_id", flight_id).execute()
+
+    async def list_flights(self, flight_ids: List[str], columns: str = "*") -> List[dict]:
+        # Ids go in the URL, so look them up in slices to stay under request line limits
+        slices = [flight_ids[i:i + ID_FILTER_CHUNK] for i in range(0, len(flight_ids), ID_FILTER_CHUNK)]
+        results = await asyncio.gather(*(
+            self.client.table("flights").select(columns).in_("flight_id", ids).execute() for ids in slices
+        ))
+        return [row for res in results for row in res.data]
+
+    async def upsert_flights(self, flights: List[dict]) -> None:
+        if flights:
+            await self.client.table("flights").upsert(flights, on_conflict="flight_id").execute()
+
+    # --- Bookings ---
+
+    async def get_booking(self, ref_id: str) -> Optional[dict]:
+        res = await self.client.table("bookings").select("*").eq("ref_id", ref_id).execute()
+        return res.data[0] if res.data else None
+
+    async def list_user_bookings(self, user_id: str) -> List[dict]:
+        res = await self.client.table("bookings").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        return res.data
+
+    async def insert_booking(self, booking: dict) -> Optional[dict]:
+        res = await self.client.table("bookings").insert(booking).execute()
+        return res.data[0] if res.data else None
+
+    async def update_booking_status(self, ref_id: str, status: str, updated_at: str) -> None:
+        await self.client.table("bookings").update({
+            "status": status,
+            "updated_at": updated_at
+        }).eq("ref_id", ref_id).execute()
+
+    # --- Booking Events ---
+
+    async def insert_booking_event(self, event: dict) -> None:
+        await self.client.table("booking_events").insert(event).execute()
+
+    async def list_booking_events(self, ref_id: str) -> List[dict]:
+        res = await self.client.table("booking_events").select("*").eq("booking_ref_id", ref_id).order("timestamp").execute()
+        return res.data
+
+    # --- Users ---
+
+    async def get_user_by_email(self, email: str, columns: str = "*") -> Optional[dict]:
+        res = await self.client.table("users").select(columns).eq("email", email).execute()
+        return res.data[0] if res.data else None
+
+    async def insert_user(self, user: dict) -> Optional[dict]:
+        res = await self.client.table("users").insert(user).execute()
+        return res.data[0] if res.data else None
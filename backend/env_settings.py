@@ -0,0 +1,20 @@
+"""
+Settings models read from prefixed environment variables.
+"""
+import os
+
+from pydantic import BaseModel
+
+
+class EnvSettings(BaseModel):
+    """Settings whose fields can each be overridden with `<PREFIX><FIELD>`, e.g. SUPABASE_HTTP_MAX_CONNECTIONS=100."""
+
+    @classmethod
+    def from_env(cls, prefix: str, **defaults):
+        """Builds the settings from `defaults`, overridden by any `<prefix><FIELD>` variable that is set."""
+        overrides = dict(defaults)
+        for name in cls.model_fields:
+            value = os.getenv(f"{prefix}{name.upper()}")
+            if value is not None:
+                overrides[name] = value
+        return cls(**overrides)
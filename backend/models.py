@@ -0,0 +1,70 @@
+"""
+Flight and booking models, shared by the API (main.py) and the schedule import,
+and the one UTC normalization both apply to their timestamps.
+"""
+from datetime import datetime, timezone
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+def as_utc(value: datetime) -> datetime:
+    """`value` in UTC; naive datetimes are taken as UTC, aware ones are converted."""
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).astimezone(timezone.utc)
+
+# --- Enums ---
+class BookingStatus(str, Enum):
+    BOOKED = "BOOKED"
+    DEPARTED = "DEPARTED"
+    ARRIVED = "ARRIVED"
+    DELIVERED = "DELIVERED"
+    CANCELLED = "CANCELLED"
+
+# --- Pydantic Models ---
+
+# Flight Models
+class Flight(BaseModel):
+    flight_id: str
+    flight_number: str
+    airline_name: str
+    departure_datetime: datetime
+    arrival_datetime: datetime
+    origin: str
+    destination: str
+    max_weight_kg: int = 5000
+    booked_weight_kg: int = 0
+    base_price_per_kg: float = 5.00
+
+# Booking Models
+class BookingCreate(BaseModel):
+    ref_id: str = Field(..., description="Human-friendly unique ID")
+    user_id: Optional[str] = Field(None, description="ID of the user creating the booking")
+    origin: str
+    destination: str
+    pieces: int
+    weight_kg: int
+    flight_ids: Optional[List[str]] = Field(default=[], description="List of flight IDs if known at creation")
+    # Status defaults to BOOKED on creation
+
+class BookingEvent(BaseModel):
+    id: Optional[str] = None
+    booking_ref_id: str
+    status: BookingStatus
+    location: Optional[str] = None
+    flight_id: Optional[str] = None
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    metadata: Optional[dict] = {}
+
+class BookingDataset(BaseModel):
+    ref_id: str
+    user_id: Optional[str] = None
+    origin: str
+    destination: str
+    pieces: int
+    weight_kg: int
+    status: BookingStatus
+    flight_ids: List[str] = []
+    created_at: datetime
+    updated_at: datetime
+    # We will likely fetch events separately or nest them if needed
+    events: Optional[List[BookingEvent]] = None
@@ -0,0 +1,387 @@
+"""
+Circuit breakers, request deadlines and hedged reads for the Supabase and Upstash calls.
+
+`ResilientStore` wraps a repository or cache client (outside its `InstrumentedStore`) and,
+for every awaitable call:
+- skips the call with `CircuitOpenError` while the dependency's circuit is open, so a failing
+  cache is bypassed at once instead of timing out on every request;
+- bounds the call by the dependency's own timeout and by what is left of the request
+  deadline (`DeadlineMiddleware`, REQUEST_DEADLINE_MS), whichever is shorter;
+- optionally hedges idempotent reads: when the first attempt has not answered after
+  `hedge_after_ms`, a second one is sent and the first answer wins.
+
+Lock commands (`lock_client`) use the dependency's `lock_timeout_ms` instead of its cache
+timeout: a slow lock SET should wait, not fail the booking as a cache miss would.
+
+Per-dependency settings come from `<NAME>_RESILIENCE_<FIELD>`, e.g.
+REDIS_RESILIENCE_TIMEOUT_MS=250 or SUPABASE_RESILIENCE_HEDGE_AFTER_MS=80.
+"""
+import asyncio
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import httpx
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+import telemetry
+from env_settings import EnvSettings
+
+# Reads that can be sent twice without side effects
+IDEMPOTENT_READS = frozenset({
+    # Repository
+    "get_flight", "search_flights", "list_flights", "list_flights_departing",
+    "get_booking", "list_user_bookings", "list_booking_events", "get_user_by_email",
+    # Cache
+    "get", "smembers",
+})
+
+
+class CircuitOpenError(Exception):
+    """A call was skipped because its dependency's circuit is open."""
+
+    def __init__(self, dependency: str, retry_after_s: float):
+        super().__init__(f"{dependency} is unavailable (circuit open)")
+        self.dependency = dependency
+        self.retry_after_s = retry_after_s
+
+
+class DependencyTimeout(TimeoutError):
+    """A call ran past its dependency's timeout."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran out of its deadline budget."""
+
+
+# SQLSTATE classes of server-side trouble: connection, insufficient resources,
+# operator intervention (e.g. statement timeout, shutdown), system and internal errors
+SERVER_SQLSTATE_CLASSES = ("08", "53", "57", "58", "XX")
+
+
+def _is_server_api_error(error: BaseException) -> bool:
+    # postgrest is only imported here, once a call has failed
+    from postgrest.exceptions import APIError
+
+    if not isinstance(error, APIError):
+        return False
+    if isinstance(error.code, int):
+        # A non-JSON error body: the code is the HTTP status
+        return error.code >= 500
+    code = error.code or ""
+    # PGRST0xx: PostgREST could not reach or use the database (503/504)
+    return code.startswith("PGRST0") or code[:2] in SERVER_SQLSTATE_CLASSES
+
+
+def is_failure(error: BaseException) -> bool:
+    """
+    Errors that say the dependency is unhealthy: timeouts, transport errors and 5xx answers
+    (httpx.HTTPStatusError from the Upstash pool, server-side postgrest APIErrors).
+    Errors in an answer (a constraint violation, a bad command, other 4xx) mean it is up.
+    """
+    if isinstance(error, (TimeoutError, OSError, httpx.TransportError)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return _is_server_api_error(error)
+
+
+class ResilienceSettings(EnvSettings):
+    # Consecutive failures that open the circuit
+    failure_threshold: int = 5
+    # Time the circuit stays open before one probe call is let through
+    reset_timeout_s: float = 10.0
+    # Per-call timeout; None leaves only the request deadline
+    timeout_ms: Optional[float] = None
+    # Per-call timeout of lock commands (see lock_client); None leaves only the request deadline
+    lock_timeout_ms: Optional[float] = None
+    # Hedge idempotent reads that have not answered after this long; None disables hedging
+    hedge_after_ms: Optional[float] = None
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass, consecutive failures are counted.
+    Open: calls are rejected until `reset_timeout_s` has passed.
+    Half-open: a single probe call passes; its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == "open" and self._clock() - self._opened_at >= self.reset_timeout_s:
+            self._transition("half_open")
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        self._state = state
+        if state == "open":
+            self._opened_at = self._clock()
+        telemetry.circuit_transitions.add(1, {"dependency": self.name, "state": state})
+
+    def allow(self) -> None:
+        """Admits a call or raises CircuitOpenError. Every admitted call must report its outcome."""
+        with self._lock:
+            state = self._current_state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            retry_after = max(0.0, self.reset_timeout_s - (self._clock() - self._opened_at))
+        telemetry.circuit_rejections.add(1, {"dependency": self.name})
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != "closed":
+                self._transition("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._probing = False
+            self._failures += 1
+            if self._state == "half_open" or (self._state == "closed" and self._failures >= self.failure_threshold):
+                self._transition("open")
+
+    def release(self) -> None:
+        """Ends an admitted call that says nothing about the dependency's health (e.g. cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self._current_state(), "consecutive_failures": self._failures}
+
+
+# --- Per-dependency registry ---
+
+# Upstash answers in milliseconds; anything slower is better treated as a cache miss.
+# Locks get longer, but well under the 5s lock TTL.
+DEFAULT_SETTINGS = {"redis": {"timeout_ms": 250, "lock_timeout_ms": 2000}}
+
+_registry_lock = threading.Lock()
+_settings: Dict[str, ResilienceSettings] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def settings_for(name: str) -> ResilienceSettings:
+    with _registry_lock:
+        if name not in _settings:
+            _settings[name] = ResilienceSettings.from_env(f"{name.upper()}_RESILIENCE_", **DEFAULT_SETTINGS.get(name, {}))
+        return _settings[name]
+
+
+def breaker_for(name: str) -> CircuitBreaker:
+    """The process-wide breaker of a dependency, shared by all requests."""
+    settings = settings_for(name)
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, settings.failure_threshold, settings.reset_timeout_s)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, dict]:
+    with _registry_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+# --- Request deadlines ---
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left until the request deadline (monotonic clock), None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Bounds the calls inside the block to `seconds` from now (an earlier outer deadline still wins)."""
+    current = _deadline.get()
+    token = _deadline.set(min(time.monotonic() + seconds, current if current is not None else float("inf")))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """
+    Gives each HTTP request a deadline of `timeout_ms`; data store calls then get what is left.
+    Long-running endpoints (the streaming schedule import) are listed in `exempt_paths`.
+    """
+
+    def __init__(self, app: ASGIApp, timeout_ms: float, exempt_paths: Tuple[str, ...] = ()) -> None:
+        self.app = app
+        self.timeout_ms = timeout_ms
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.timeout_ms <= 0 or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        with deadline(self.timeout_ms / 1000):
+            await self.app(scope, receive, send)
+
+
+# --- Store proxy ---
+
+def _discard(awaitable) -> None:
+    # Close a call that will never be awaited (avoids "coroutine was never awaited")
+    if inspect.iscoroutine(awaitable):
+        awaitable.close()
+
+
+async def _hedged(first, call_again: Callable, delay_s: float, name: str):
+    """Awaits `first`; if it is still running after `delay_s`, races it against a second attempt."""
+    primary = asyncio.ensure_future(first)
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay_s)
+        if done:
+            return primary.result()
+        hedge = asyncio.ensure_future(call_again())
+        pending.add(hedge)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = "primary" if task is primary else "hedge"
+                    telemetry.hedged_reads.add(1, {"dependency": name, "winner": winner})
+                    return task.result()
+                error = task.exception()
+        # Both attempts failed
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class ResilientStore:
+    """
+    Proxy that guards every awaitable call of a repository or cache client with the
+    dependency's circuit breaker, timeout/deadline and, for idempotent reads, hedging.
+    """
+
+    def __init__(self, inner, name: str, settings: Optional[ResilienceSettings] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self._inner = inner
+        self._name = name
+        self._settings = settings or settings_for(name)
+        self._breaker = breaker or breaker_for(name)
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not inspect.isawaitable(result):
+                return result
+            return self._guarded(name, result, lambda: attr(*args, **kwargs))
+        return call
+
+    def with_timeout(self, timeout_ms: Optional[float]) -> "ResilientStore":
+        """The same store and breaker with another per-call timeout."""
+        return ResilientStore(self._inner, self._name, self._settings.model_copy(update={"timeout_ms": timeout_ms}), self._breaker)
+
+    def _timeout(self) -> Tuple[Optional[float], bool]:
+        """The call's timeout in seconds and whether the request deadline is what limits it."""
+        call_timeout = self._settings.timeout_ms / 1000 if self._settings.timeout_ms else None
+        budget = remaining_budget()
+        if budget is not None and (call_timeout is None or budget < call_timeout):
+            return budget, True
+        return call_timeout, False
+
+    async def _guarded(self, operation: str, awaitable, call_again: Callable):
+        try:
+            self._breaker.allow()
+        except CircuitOpenError:
+            _discard(awaitable)
+            raise
+
+        timeout, by_deadline = self._timeout()
+        if timeout is not None and timeout <= 0:
+            _discard(awaitable)
+            self._breaker.release()
+            telemetry.deadline_exceeded.add(1, {"dependency": self._name})
+            raise DeadlineExceeded(f"Request deadline passed before {self._name} {operation}")
+
+        hedge_after = self._settings.hedge_after_ms
+        if hedge_after is not None and operation in IDEMPOTENT_READS:
+            awaitable = _hedged(awaitable, call_again, hedge_after / 1000, self._name)
+        try:
+            result = await (asyncio.wait_for(awaitable, timeout) if timeout is not None else awaitable)
+        except asyncio.TimeoutError as e:
+            if isinstance(e, (DeadlineExceeded, DependencyTimeout)):
+                # Raised by a nested guarded call
+                self._breaker.release()
+                raise
+            if by_deadline:
+                # The request ran out of time, which says nothing about the dependency
+                self._breaker.release()
+                telemetry.deadline_exceeded.add(1, {"dependency": self._name})
+                raise DeadlineExceeded(f"Request deadline exceeded during {self._name} {operation}") from e
+            self._breaker.record_failure()
+            raise DependencyTimeout(f"{self._name} {operation} timed out after {timeout * 1000:.0f}ms") from e
+        except Exception as e:
+            if is_failure(e):
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_success()
+            raise
+        except BaseException:
+            # Cancelled
+            self._breaker.release()
+            raise
+        self._breaker.record_success()
+        return result
+
+
+def lock_client(cache):
+    """`cache` for lock commands: its lock timeout replaces the cache timeout (breaker and deadline still apply)."""
+    if isinstance(cache, ResilientStore):
+        return cache.with_timeout(cache._settings.lock_timeout_ms)
+    return cache
+
+
+# --- HTTP error mapping ---
+
+async def circuit_open_handler(request: Request, exc: CircuitOpenError) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.dependency} is temporarily unavailable, please retry"},
+        headers={"Retry-After": str(max(1, round(exc.retry_after_s)))},
+    )
+
+
+async def timeout_handler(request: Request, exc: TimeoutError) -> JSONResponse:
+    return JSONResponse(status_code=504, content={"detail": str(exc) or "Upstream timeout"})
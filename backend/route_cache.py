@@ -0,0 +1,72 @@
+"""
+Route search cache with incremental invalidation.
+
+Every cached /route result is also listed in two index sets: one per (origin, day) and
+one per (destination, day). A changed flight then maps to the few sets whose routes it
+can appear in, and only those entries are dropped instead of flushing the cache.
+"""
+import asyncio
+from datetime import date, timedelta
+from typing import Iterable, List, Tuple
+
+ROUTE_TTL_S = 300
+# Index sets outlive the entries they list; stale members are harmless
+INDEX_TTL_S = ROUTE_TTL_S + 60
+# Keys per DEL command when invalidating
+DELETE_CHUNK = 500
+
+
+def route_key(origin: str, destination: str, day: date) -> str:
+    return f"route:{origin}:{destination}:{day.isoformat()}"
+
+
+def origin_index(origin: str, day: date) -> str:
+    return f"routeidx:from:{origin}:{day.isoformat()}"
+
+
+def destination_index(destination: str, day: date) -> str:
+    return f"routeidx:to:{destination}:{day.isoformat()}"
+
+
+async def store_route(redis, origin: str, destination: str, day: date, payload: str) -> None:
+    """
+    Caches a route result and lists it in its index sets. Each set gets its EXPIRE only after
+    the SADD that may have created it; the payload SET and the two sets run concurrently.
+    """
+    key = route_key(origin, destination, day)
+
+    async def add_to_index(index: str) -> None:
+        await redis.sadd(index, key)
+        await redis.expire(index, INDEX_TTL_S)
+
+    await asyncio.gather(
+        redis.set(key, payload, ex=ROUTE_TTL_S),
+        add_to_index(origin_index(origin, day)),
+        add_to_index(destination_index(destination, day)),
+    )
+
+
+def affected_indexes(origin: str, destination: str, day: date) -> List[str]:
+    """
+    Index sets holding the searches a flight `origin` -> `destination` leaving on `day` shows up in:
+    direct and first-leg results of searches from `origin` that day, and second-leg results of
+    searches to `destination` started that day or the day before (connections may leave next day).
+    """
+    return [
+        origin_index(origin, day),
+        destination_index(destination, day),
+        destination_index(destination, day - timedelta(days=1)),
+    ]
+
+
+async def invalidate_routes(redis, placements: Iterable[Tuple[str, str, date]]) -> int:
+    """Drops the cached routes that may include flights at these (origin, destination, day) placements."""
+    indexes = sorted({index for placement in placements for index in affected_indexes(*placement)})
+    if not indexes:
+        return 0
+    members = await asyncio.gather(*(redis.smembers(index) for index in indexes))
+    keys = sorted({key for found in members for key in (found or [])})
+    await asyncio.gather(*(
+        redis.delete(*keys[i:i + DELETE_CHUNK]) for i in range(0, len(keys), DELETE_CHUNK)
+    ))
+    return len(keys)
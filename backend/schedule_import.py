@@ -0,0 +1,302 @@
+"""
+Streaming flight schedule import (CSV or NDJSON), shared by POST /flights/import and the CLI.
+
+Rows are read line by line and validated against the `Flight` model in batches. Each batch
+is upserted by flight_id, so memory stays bounded by the batch size whatever the file size.
+Rows identical to the stored flight are skipped, and booked_weight_kg is never written:
+bookings own it. After every batch the changed flights are sent to the change listeners;
+the route cache listener drops only the cached searches those flights can appear in.
+
+CSV needs a header row with the Flight field names; quoted fields may not span lines.
+Empty CSV fields take the model default.
+
+CLI (from backend/, uses STORAGE_BACKEND / CACHE_BACKEND like the API):
+    python schedule_import.py winter_schedule.csv
+    python schedule_import.py schedule.ndjson --batch-size 2000
+    cat schedule.csv | python schedule_import.py - --format csv
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import sys
+from datetime import date, datetime
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple, Union
+
+from pydantic import BaseModel, ValidationError
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+import route_cache
+from models import Flight, as_utc
+
+FORMATS = ("csv", "ndjson")
+DEFAULT_BATCH_SIZE = 1000
+# Only the first errors are reported, so a bad file cannot grow the report without bound
+MAX_REPORTED_ERRORS = 20
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class RowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportProgress(BaseModel):
+    batches: int = 0
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # Rows replaced by a later row for the same flight_id in the same batch
+    duplicates: int = 0
+    rejected: int = 0
+    errors: List[RowError] = []
+    done: bool = False
+    failed: Optional[str] = None
+
+    def reject(self, line: int, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line=line, error=error))
+
+
+class FlightChange(BaseModel):
+    """Change notification for one imported flight."""
+    flight_id: str
+    kind: str  # "created" or "updated"
+    # (origin, destination, UTC departure day) now and, if the flight moved, before
+    placements: List[Tuple[str, str, date]]
+
+
+ChangeListener = Callable[[List[FlightChange]], Awaitable[None]]
+# A parsed row, or the reason the line could not be parsed
+Record = Tuple[int, Union[dict, str]]
+
+
+def format_for(content_type: Optional[str] = None, filename: Optional[str] = None) -> Optional[str]:
+    """Schedule format from a Content-Type header or a file name, None when unknown."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+# --- Parsing ---
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Decodes a UTF-8 byte stream into lines, holding at most one partial line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def parse_records(lines: AsyncIterable[str], fmt: str) -> AsyncIterator[Record]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown schedule format: {fmt}")
+    header: Optional[List[str]] = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"Invalid JSON: {e}"
+                continue
+            yield (line_no, row) if isinstance(row, dict) else (line_no, "Expected a JSON object")
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, f"Expected {len(header)} fields, got {len(values)}"
+            continue
+        yield line_no, {name: value for name, value in zip(header, values) if value != ""}
+
+
+# --- Import ---
+
+def _schedule_row(flight) -> dict:
+    """The columns an import writes, with UTC timestamps (naive times are taken as UTC)."""
+    row = flight.model_dump(exclude={"booked_weight_kg"})
+    row["departure_datetime"] = as_utc(row["departure_datetime"]).isoformat()
+    row["arrival_datetime"] = as_utc(row["arrival_datetime"]).isoformat()
+    return row
+
+
+def _placement(row: dict) -> Tuple[str, str, date]:
+    return row["origin"], row["destination"], datetime.fromisoformat(row["departure_datetime"]).date()
+
+
+async def _apply_batch(batch: List[Record], repo, listeners: Sequence[ChangeListener], progress: ImportProgress):
+    valid = {}
+    for line_no, row in batch:
+        progress.processed += 1
+        if isinstance(row, str):
+            progress.reject(line_no, row)
+            continue
+        try:
+            flight = Flight.model_validate(row)
+        except ValidationError as e:
+            progress.reject(line_no, "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+            continue
+        if flight.flight_id in valid:
+            progress.duplicates += 1
+        valid[flight.flight_id] = _schedule_row(flight)
+
+    stored = {
+        f["flight_id"]: _schedule_row(Flight.model_validate(f))
+        for f in await repo.list_flights(list(valid))
+    }
+    rows, changes = [], []
+    for flight_id, row in valid.items():
+        previous = stored.get(flight_id)
+        if previous == row:
+            progress.unchanged += 1
+            continue
+        placements = [_placement(row)]
+        if previous is not None and _placement(previous) != placements[0]:
+            placements.append(_placement(previous))
+        rows.append(row)
+        changes.append(FlightChange(
+            flight_id=flight_id, kind="updated" if previous else "created", placements=placements
+        ))
+
+    await repo.upsert_flights(rows)
+    progress.created += sum(1 for c in changes if c.kind == "created")
+    progress.updated += sum(1 for c in changes if c.kind == "updated")
+    progress.batches += 1
+
+    if changes:
+        results = await asyncio.gather(*(listener(changes) for listener in listeners), return_exceptions=True)
+        for result in results:
+            # Listeners are best-effort (like cache writes): the rows are already stored
+            if isinstance(result, Exception):
+                print(f"Flight change listener error: {result}")
+
+
+async def import_schedule(
+    records: AsyncIterable[Record],
+    repo,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    listeners: Sequence[ChangeListener] = (),
+) -> AsyncIterator[ImportProgress]:
+    """Validates and upserts `records` batch by batch, yielding the running totals after each batch."""
+    progress = ImportProgress()
+    batch: List[Record] = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await _apply_batch(batch, repo, listeners, progress)
+            batch = []
+            yield progress
+    if batch:
+        await _apply_batch(batch, repo, listeners, progress)
+    progress.done = True
+    yield progress
+
+
+def route_cache_listener(redis) -> ChangeListener:
+    """Change listener that drops the cached route searches affected by the changed flights."""
+    async def invalidate(changes: List[FlightChange]) -> None:
+        await route_cache.invalidate_routes(redis, [p for change in changes for p in change.placements])
+    return invalidate
+
+
+# --- HTTP ---
+
+async def progress_lines(progress: AsyncIterator[ImportProgress]) -> AsyncIterator[str]:
+    """NDJSON progress lines; a failure ends the stream with a `failed` line instead of a cut connection."""
+    last = ImportProgress()
+    try:
+        async for last in progress:
+            yield last.model_dump_json() + "\n"
+    except Exception as e:
+        last.failed = str(e)
+        yield last.model_dump_json() + "\n"
+
+
+class ProgressStreamResponse(StreamingResponse):
+    """
+    Streams progress while the request body is still being read. StreamingResponse would
+    also wait for http.disconnect on `receive` (ASGI spec < 2.4), swallowing body chunks.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+
+# --- CLI ---
+
+async def file_chunks(stream, size: int = READ_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    while chunk := stream.read(size):
+        yield chunk
+
+
+async def main_async(args: argparse.Namespace) -> ImportProgress:
+    from db.clients import clients, get_redis
+    from db.repository import get_repository
+
+    fmt = args.format or format_for(filename=args.path)
+    if fmt is None:
+        raise SystemExit("Cannot tell the format from the file name, pass --format csv|ndjson")
+
+    stream = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    try:
+        records = parse_records(iter_lines(file_chunks(stream)), fmt)
+        listeners = [] if args.no_cache_invalidation else [route_cache_listener(await get_redis())]
+        last = ImportProgress()
+        async for last in import_schedule(records, await get_repository(), args.batch_size, listeners):
+            print(
+                f"batch {last.batches}: {last.processed} rows, {last.created} created, {last.updated} updated, "
+                f"{last.unchanged} unchanged, {last.rejected} rejected",
+                file=sys.stderr,
+            )
+        return last
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+        await clients.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Schedule file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="Default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--no-cache-invalidation", action="store_true", help="Skip route cache invalidation")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    progress = asyncio.run(main_async(args))
+    print(progress.model_dump_json(indent=2))
+    if progress.rejected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+OpenTelemetry tracing and metrics for the API.
+
+Exporters are picked per signal with the standard variables:
+    OTEL_TRACES_EXPORTER   otlp | console | memory | none
+    OTEL_METRICS_EXPORTER  otlp | console | memory | none
+Both default to otlp when OTEL_EXPORTER_OTLP_ENDPOINT is set and to none otherwise;
+with both at none (or OTEL_SDK_DISABLED=true) telemetry is a no-op.
+
+"memory" keeps everything in process (`memory_span_exporter`, `memory_metric_reader`)
+for local runs and tests; "console" prints spans and, every
+OTEL_METRIC_EXPORT_INTERVAL ms, the metrics.
+
+Sampling: OTEL_TRACES_SAMPLER (default parentbased_always_on) and OTEL_TRACES_SAMPLER_ARG,
+e.g. parentbased_traceidratio with 0.1 keeps 10% of new traces.
+"""
+import inspect
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+from opentelemetry import metrics, trace
+from opentelemetry.metrics import CallbackOptions, Observation
+from opentelemetry.trace import SpanKind
+
+SERVICE_NAME = "gocomet-backend"
+
+tracer = trace.get_tracer(SERVICE_NAME)
+meter = metrics.get_meter(SERVICE_NAME)
+
+# --- Instruments ---
+# Created against the global (proxy) meter, so they start exporting once
+# `setup_telemetry` installs the provider.
+
+store_operation_duration = meter.create_histogram(
+    "datastore.operation.duration",
+    unit="ms",
+    description="Latency of each storage/cache call, by db.system and operation",
+)
+route_cache_lookups = meter.create_counter(
+    "route.cache.lookups",
+    description="Route cache lookups, by result: hit, miss or error",
+)
+route_queries = meter.create_histogram(
+    "route.queries",
+    description="Storage queries issued per /route request",
+)
+lock_wait = meter.create_histogram(
+    "booking.lock.wait",
+    unit="ms",
+    description="Time spent acquiring the flight lock, by whether it was acquired",
+)
+lock_contention = meter.create_counter(
+    "booking.lock.contention",
+    description="Lock attempts that found the flight already locked",
+)
+capacity_failures = meter.create_counter(
+    "booking.capacity.failures",
+    description="Bookings rejected for capacity, by stage: precheck or locked (double-check)",
+)
+circuit_transitions = meter.create_counter(
+    "resilience.circuit.transitions",
+    description="Circuit breaker state changes, by dependency and new state",
+)
+circuit_rejections = meter.create_counter(
+    "resilience.circuit.rejections",
+    description="Data store calls skipped because the dependency's circuit was open",
+)
+deadline_exceeded = meter.create_counter(
+    "resilience.deadline.exceeded",
+    description="Data store calls cut short by the request deadline, by dependency",
+)
+hedged_reads = meter.create_counter(
+    "resilience.hedged_reads",
+    description="Reads that sent a hedge request, by dependency and winner: primary or hedge",
+)
+
+_route_cache_totals = {"hit": 0, "miss": 0}
+
+
+def _observe_route_cache_hit_ratio(options: CallbackOptions) -> Iterator[Observation]:
+    lookups = _route_cache_totals["hit"] + _route_cache_totals["miss"]
+    if lookups:
+        yield Observation(_route_cache_totals["hit"] / lookups)
+
+
+meter.create_observable_gauge(
+    "route.cache.hit_ratio",
+    callbacks=[_observe_route_cache_hit_ratio],
+    description="Share of route cache lookups served from the cache since startup",
+)
+
+
+def record_route_cache(result: str) -> None:
+    """Counts a route cache lookup ("hit", "miss" or "error") and tags the request span."""
+    route_cache_lookups.add(1, {"result": result})
+    if result in _route_cache_totals:
+        _route_cache_totals[result] += 1
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.attributes["route.cache.result"] = result
+    trace.get_current_span().set_attribute("route.cache.result", result)
+
+
+# --- Per-request query counting ---
+
+class QueryCounter:
+    def __init__(self):
+        self.value = 0
+        # Attributes for the per-request metric, e.g. the route cache result
+        self.attributes = {}
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """
+    Counts the storage calls made inside the block, including ones in tasks
+    spawned from it (asyncio.gather copies the context, the counter is shared).
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
+# --- Data store instrumentation ---
+
+class InstrumentedStore:
+    """
+    Proxy that wraps every awaitable call of a repository or cache client in a
+    CLIENT span and records its latency. `counts_as_query` makes the calls
+    count towards `count_queries()`.
+    """
+
+    def __init__(self, inner, system: str, counts_as_query: bool = False):
+        self._inner = inner
+        self._system = system
+        self._counts_as_query = counts_as_query
+
+    def __getattr__(self, name):
+        attr = getattr(self._inner, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # Upstash commands are plain methods returning coroutines, so check the result
+            if not inspect.isawaitable(result):
+                return result
+            return self._traced(name, result)
+        return call
+
+    async def _traced(self, operation: str, awaitable):
+        if self._counts_as_query:
+            counter = _query_counter.get()
+            if counter is not None:
+                counter.value += 1
+        attributes = {"db.system": self._system, "db.operation.name": operation}
+        error = False
+        start = time.perf_counter()
+        with tracer.start_as_current_span(f"{self._system} {operation}", kind=SpanKind.CLIENT, attributes=attributes):
+            try:
+                return await awaitable
+            except Exception:
+                error = True
+                raise
+            finally:
+                store_operation_duration.record(
+                    (time.perf_counter() - start) * 1000, {**attributes, "error": error}
+                )
+
+
+# --- Provider setup ---
+
+memory_span_exporter = None
+memory_metric_reader = None
+
+
+def _span_processors(exporter_name: str, headers: dict) -> List:
+    global memory_span_exporter
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return [BatchSpanProcessor(OTLPSpanExporter(endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"), headers=headers))]
+    if exporter_name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return [BatchSpanProcessor(ConsoleSpanExporter())]
+    if exporter_name == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        memory_span_exporter = InMemorySpanExporter()
+        return [SimpleSpanProcessor(memory_span_exporter)]
+    raise ValueError(f"Unknown OTEL_TRACES_EXPORTER: {exporter_name}")
+
+
+def _metrics_endpoint() -> Optional[str]:
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_METRICS_ENDPOINT")
+    if endpoint:
+        return endpoint
+    endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not endpoint:
+        return None
+    # OTEL_EXPORTER_OTLP_ENDPOINT is used as the full traces URL; point at the metrics path instead
+    base = endpoint.rstrip("/")
+    if base.endswith("/v1/traces"):
+        base = base[: -len("/v1/traces")]
+    return f"{base}/v1/metrics"
+
+
+def _metric_readers(exporter_name: str, headers: dict) -> List:
+    global memory_metric_reader
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+
+    interval_ms = float(os.getenv("OTEL_METRIC_EXPORT_INTERVAL", "60000"))
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+        exporter = OTLPMetricExporter(endpoint=_metrics_endpoint(), headers=headers)
+        return [PeriodicExportingMetricReader(exporter, export_interval_millis=interval_ms)]
+    if exporter_name == "console":
+        from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+        return [PeriodicExportingMetricReader(ConsoleMetricExporter(), export_interval_millis=interval_ms)]
+    if exporter_name == "memory":
+        from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+        memory_metric_reader = InMemoryMetricReader()
+        return [memory_metric_reader]
+    raise ValueError(f"Unknown OTEL_METRICS_EXPORTER: {exporter_name}")
+
+
+def _sampler(name: str, arg: Optional[str]):
+    from opentelemetry.sdk.trace import sampling
+
+    ratio = float(arg) if arg else 1.0
+    samplers = {
+        "always_on": lambda: sampling.ALWAYS_ON,
+        "always_off": lambda: sampling.ALWAYS_OFF,
+        "traceidratio": lambda: sampling.TraceIdRatioBased(ratio),
+        "parentbased_always_on": lambda: sampling.ParentBased(sampling.ALWAYS_ON),
+        "parentbased_always_off": lambda: sampling.ParentBased(sampling.ALWAYS_OFF),
+        # Root spans are sampled at `ratio`, child spans follow the caller's decision
+        "parentbased_traceidratio": lambda: sampling.ParentBased(sampling.TraceIdRatioBased(ratio)),
+    }
+    if name not in samplers:
+        raise ValueError(f"Unknown OTEL_TRACES_SAMPLER: {name}")
+    return samplers[name]()
+
+
+def exporter_name(signal: str) -> str:
+    """
+    Exporter for "TRACES" or "METRICS": OTEL_<SIGNAL>_EXPORTER, else "otlp" when an
+    OTLP endpoint is configured and "none" otherwise. Everything is "none" when
+    OTEL_SDK_DISABLED=true.
+    """
+    if os.getenv("OTEL_SDK_DISABLED", "false").lower() == "true":
+        return "none"
+    configured = os.getenv(f"OTEL_{signal}_EXPORTER")
+    if configured:
+        return configured.lower()
+    endpoint = os.getenv(f"OTEL_EXPORTER_OTLP_{signal}_ENDPOINT") or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    return "otlp" if endpoint else "none"
+
+
+_providers_installed = False
+
+
+def setup_telemetry(app) -> None:
+    """
+    Installs the tracer and meter providers (once per process) and instruments the app.
+    With no exporter configured this is a no-op: the SDK is never imported and the
+    API's no-op tracer/meter back every span and instrument.
+    """
+    global _providers_installed
+    traces_exporter, metrics_exporter = exporter_name("TRACES"), exporter_name("METRICS")
+    if traces_exporter == "none" and metrics_exporter == "none":
+        return
+
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    if not _providers_installed:
+        from opentelemetry.sdk.resources import Resource
+
+        resource = Resource.create(attributes={"service.name": SERVICE_NAME})
+        # We explicitly pass headers here to avoid .env parsing issues with spaces
+        auth_token = os.getenv("GRAFANA_AUTH_TOKEN")
+        headers = {"Authorization": f"Basic {auth_token}"} if auth_token else {}
+
+        if traces_exporter != "none":
+            from opentelemetry.sdk.trace import TracerProvider
+
+            sampler = _sampler(
+                os.getenv("OTEL_TRACES_SAMPLER", "parentbased_always_on").lower(),
+                os.getenv("OTEL_TRACES_SAMPLER_ARG"),
+            )
+            tracer_provider = TracerProvider(resource=resource, sampler=sampler)
+            for processor in _span_processors(traces_exporter, headers):
+                tracer_provider.add_span_processor(processor)
+            trace.set_tracer_provider(tracer_provider)
+
+        if metrics_exporter != "none":
+            from opentelemetry.sdk.metrics import MeterProvider
+
+            readers = _metric_readers(metrics_exporter, headers)
+            metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=readers))
+        _providers_installed = True
+
+    FastAPIInstrumentor.instrument_app(app)
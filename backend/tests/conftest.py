@@ -0,0 +1,11 @@
+import os
+import pytest
+
+# Keep spans and metrics in process during tests instead of exporting over OTLP
+os.environ.setdefault("OTEL_TRACES_EXPORTER", "memory")
+os.environ.setdefault("OTEL_METRICS_EXPORTER", "memory")
+
+@pytest.fixture
+def anyio_backend():
+    # Async tests run on asyncio only, the app's event loop
+    return "asyncio"
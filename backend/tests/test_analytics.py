@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+from collections import defaultdict
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+from main import app, get_current_user
+from benchmarks.network import NetworkSpec, generate_network
+from db.repository import get_repository
+from db.clients import get_redis
+from db.memory_cache import MemoryRedis
+from db.sqlite_repository import SQLiteRepository
+
+def flight(flight_id, origin, destination, dep, airline="Air India", max_kg=5000, booked=0, price=5.0):
+    return {
+        "flight_id": flight_id, "flight_number": flight_id, "airline_name": airline,
+        "departure_datetime": dep, "arrival_datetime": dep, "origin": origin, "destination": destination,
+        "max_weight_kg": max_kg, "booked_weight_kg": booked, "base_price_per_kg": price,
+    }
+
+FLIGHTS = [
+    flight("F1", "DEL", "BOM", "2023-10-15T10:00:00", booked=4950, price=5.0),
+    flight("F2", "DEL", "BOM", "2023-10-15T18:00:00", booked=1000, price=4.0),
+    flight("F3", "DEL", "BLR", "2023-10-16T09:00:00", airline="IndiGo", max_kg=2000, booked=500, price=6.0),
+    flight("F4", "BOM", "DEL", "2023-10-17T09:00:00"),
+    # Outside the range
+    flight("F5", "DEL", "BOM", "2023-10-18T00:00:00", booked=5000),
+]
+
+URL = "/analytics/capacity?start=2023-10-15&end=2023-10-17"
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.fixture
+def stores(monkeypatch):
+    monkeypatch.setenv("OPERATOR_EMAILS", "ops@example.com")
+    repo = SQLiteRepository(":memory:")
+    asyncio.run(repo.insert_flights(FLIGHTS))
+    cache = MemoryRedis()
+    app.dependency_overrides[get_repository] = lambda: repo
+    app.dependency_overrides[get_redis] = lambda: cache
+    app.dependency_overrides[get_current_user] = lambda: {"id": "ops", "email": "ops@example.com"}
+    yield repo, cache
+    app.dependency_overrides.clear()
+    repo.close()
+
+def by_key(rows):
+    return {row["key"]: row for row in rows}
+
+def test_capacity_report(client, stores):
+    res = client.get(URL)
+    assert res.status_code == 200
+    report = res.json()
+    assert (report["start"], report["end"]) == ("2023-10-15", "2023-10-17")
+
+    assert report["totals"] == {
+        "flights": 4, "capacity_kg": 17000, "booked_kg": 6450, "remaining_kg": 10550,
+        "load_factor": round(6450 / 17000, 4), "revenue": 4950 * 5.0 + 1000 * 4.0 + 500 * 6.0,
+        "remaining_revenue": 50 * 5.0 + 4000 * 4.0 + 1500 * 6.0 + 5000 * 5.0, "near_full_flights": 1,
+    }
+
+    routes = by_key(report["groups"]["route"])
+    assert list(routes) == ["BOM-DEL", "DEL-BLR", "DEL-BOM"]
+    assert routes["DEL-BOM"]["flights"] == 2
+    assert routes["DEL-BOM"]["load_factor"] == 0.595
+    assert routes["DEL-BOM"]["near_full_flights"] == 1
+
+    assert by_key(report["groups"]["airline"])["IndiGo"]["remaining_kg"] == 1500
+    assert by_key(report["groups"]["origin"])["DEL"]["flights"] == 3
+    days = by_key(report["groups"]["day"])
+    assert list(days) == ["2023-10-15", "2023-10-16", "2023-10-17"]
+    assert days["2023-10-17"]["load_factor"] == 0.0
+
+def test_capacity_report_is_cached(client, stores):
+    repo, _ = stores
+    first = client.get(URL + "&group_by=day&group_by=route")
+    assert list(first.json()["groups"]) == ["route", "day"]
+
+    asyncio.run(repo.update_flight_booked_weight("F4", 5000))
+    # Same dimensions in another order share the entry until it expires
+    again = client.get(URL + "&group_by=route&group_by=day")
+    assert again.content == first.content
+    assert client.get(URL + "&group_by=route&group_by=day", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    # A different range is computed fresh
+    assert client.get("/analytics/capacity?start=2023-10-17&end=2023-10-17").json()["totals"]["booked_kg"] == 5000
+
+def test_capacity_report_validation(client, stores):
+    assert client.get("/analytics/capacity?start=2023-10-17&end=2023-10-15").status_code == 400
+    assert client.get("/analytics/capacity?start=2023-01-01&end=2024-01-02").status_code == 400
+    res = client.get(URL + "&group_by=flight_number")
+    assert res.status_code == 400
+    assert "flight_number" in res.json()["detail"]
+
+    empty = client.get("/analytics/capacity?start=2020-01-01&end=2020-01-31").json()
+    assert empty["totals"]["flights"] == 0 and empty["groups"]["route"] == []
+
+def test_capacity_report_requires_operator(client, stores):
+    app.dependency_overrides[get_current_user] = lambda: {"id": "user123", "email": "shipper@example.com"}
+    assert client.get(URL).status_code == 403
+
+def test_capacity_report_matches_row_by_row_sums():
+    rows = generate_network(NetworkSpec(days=3, flights_per_day=300, load_factor=0.9))
+    for row in rows:
+        row["departure_datetime"] = row["departure_datetime"].isoformat()
+    report = analytics.capacity_report(rows, ["airline", "day"])
+
+    expected = defaultdict(lambda: [0, 0, 0.0, 0])
+    for row in rows:
+        remaining = row["max_weight_kg"] - row["booked_weight_kg"]
+        totals = expected[row["airline_name"]]
+        totals[0] += 1
+        totals[1] += row["booked_weight_kg"]
+        totals[2] += row["booked_weight_kg"] * row["base_price_per_kg"]
+        totals[3] += remaining <= analytics.NEAR_FULL_KG
+    airlines = by_key(report["groups"]["airline"])
+    assert set(airlines) == set(expected)
+    for airline, (flights, booked, revenue, near_full) in expected.items():
+        assert airlines[airline]["flights"] == flights
+        assert airlines[airline]["booked_kg"] == booked
+        assert airlines[airline]["revenue"] == pytest.approx(revenue, abs=0.01)
+        assert airlines[airline]["near_full_flights"] == near_full
+    assert [d["flights"] for d in report["groups"]["day"]] == [300, 300, 300]
@@ -0,0 +1,22 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_core import compare, machine_factor
+
+BASELINE = {"calibration": {"median_ms": 2.0}, "small": {"route_search": {"median_ms": 10.0}}}
+
+def results(calibration_ms, route_ms):
+    return {"calibration": {"median_ms": calibration_ms}, "small": {"flights": 700, "route_search": {"median_ms": route_ms}}}
+
+def test_limits_widen_on_slower_machines_only():
+    # Twice as slow a machine: 10ms x 2 + 50%
+    assert machine_factor(results(4.0, 0), BASELINE) == 2.0
+    assert compare(results(4.0, 29.0), BASELINE, 0.5) == []
+    assert len(compare(results(4.0, 31.0), BASELINE, 0.5)) == 1
+    # A faster machine keeps the recorded limit
+    assert machine_factor(results(1.0, 0), BASELINE) == 1.0
+    assert compare(results(1.0, 14.0), BASELINE, 0.5) == []
+    # Baselines without a calibration compare absolute medians
+    assert compare(results(4.0, 16.0), {"small": BASELINE["small"]}, 0.5) != []
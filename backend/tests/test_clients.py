@@ -0,0 +1,125 @@
+import httpx
+import pytest
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.clients import ClientManager, PoolSettings, PooledHTTPClient, use_pooled_client
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+
+    def do_GET(self):
+        self.do_HEAD()
+        self.wfile.write(b"ok")
+
+    def do_POST(self):
+        # Upstash REST: the command is the JSON body, the answer {"result": ...} (base64, "cached")
+        command = self.rfile.read(int(self.headers["Content-Length"]))
+        status, body = (503, b'{"error":"ERR service unavailable"}') if b"down" in command else (200, b'{"result":"Y2FjaGVk"}')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_pool_settings_from_env(monkeypatch):
+    monkeypatch.setenv("TEST_HTTP_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("TEST_HTTP_READ_TIMEOUT", "1.5")
+    settings = PoolSettings.from_env("TEST_HTTP_")
+    assert settings.max_connections == 7
+    assert settings.timeout().read == 1.5
+    assert settings.max_keepalive_connections == PoolSettings().max_keepalive_connections
+
+@pytest.mark.anyio
+async def test_connections_are_reused(server_url):
+    client = PooledHTTPClient(PoolSettings(warmup_connections=0))
+    try:
+        for _ in range(5):
+            assert (await client.http.get(server_url)).status_code == 200
+        usage = client.usage()
+        assert usage["requests"] == 5
+        assert usage["connections_opened"] == 1
+        assert usage["in_flight"] == 0
+        assert usage["open_connections"] == 1
+    finally:
+        await client.close()
+
+@pytest.mark.anyio
+async def test_warm_up_opens_connections(server_url):
+    client = PooledHTTPClient(PoolSettings(warmup_connections=3))
+    try:
+        await client.warm_up(server_url)
+        usage = client.usage()
+        assert usage["connections_opened"] == 3
+        assert usage["idle_connections"] == usage["open_connections"] == 3
+
+        # The first real request reuses a warm connection
+        await client.http.get(server_url)
+        assert client.usage()["connections_opened"] == 3
+    finally:
+        await client.close()
+
+@pytest.mark.anyio
+async def test_upstash_client_uses_pool(server_url, monkeypatch):
+    monkeypatch.setenv("UPSTASH_REDIS_REST_URL", server_url)
+    monkeypatch.setenv("UPSTASH_REDIS_REST_TOKEN", "t")
+    manager = ClientManager()
+    redis = manager.redis
+    (replaced,) = manager._replaced_clients
+    assert await redis.get("k") == "cached"
+    # The command went through the pooled client, not the SDK's own
+    assert manager.stats()["redis"]["requests"] == 1
+
+    await manager.close()
+    assert replaced.is_closed
+
+@pytest.mark.anyio
+async def test_upstash_server_errors_keep_their_status(server_url, monkeypatch):
+    monkeypatch.setenv("UPSTASH_REDIS_REST_URL", server_url)
+    monkeypatch.setenv("UPSTASH_REDIS_REST_TOKEN", "t")
+    monkeypatch.setenv("UPSTASH_REST_RETRIES", "0")
+    manager = ClientManager()
+    try:
+        with pytest.raises(httpx.HTTPStatusError) as e:
+            await manager.redis.get("down")
+        assert e.value.response.status_code == 503
+    finally:
+        await manager.close()
+
+@pytest.mark.anyio
+async def test_start_without_warm_up_stays_lazy(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setenv("UPSTASH_REDIS_REST_URL", "http://127.0.0.1:9")
+    monkeypatch.setenv("SUPABASE_HTTP_WARMUP_CONNECTIONS", "0")
+    monkeypatch.setenv("REDIS_HTTP_WARMUP_CONNECTIONS", "0")
+    manager = ClientManager()
+    await manager.start()
+    assert (manager._supabase, manager._redis, manager.stats()) == (None, None, {})
+
+def test_use_pooled_client_fails_loudly():
+    class Redis:
+        pass
+
+    with pytest.raises(RuntimeError, match="upstash_redis internals changed"):
+        use_pooled_client(Redis(), None)
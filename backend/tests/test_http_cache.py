@@ -0,0 +1,134 @@
+import asyncio
+import gzip
+import zlib
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from compression import CompressionMiddleware, FlushingGZipResponder, accepted_encodings
+from conditional import coded_etag, etag_matches, make_etag
+from db.repository import get_repository
+from db.clients import get_redis
+from db.memory_cache import MemoryRedis
+from db.sqlite_repository import SQLiteRepository
+
+def flight(flight_id, origin, destination, dep, arr):
+    return {
+        "flight_id": flight_id, "flight_number": flight_id, "airline_name": "Air India",
+        "departure_datetime": dep, "arrival_datetime": arr, "origin": origin, "destination": destination,
+    }
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.fixture
+def repo():
+    repo = SQLiteRepository(":memory:")
+    # Enough direct flights for the route list to pass the compression threshold
+    asyncio.run(repo.insert_flights([
+        flight(f"D{i}", "DEL", "BOM", f"2023-10-15T{i:02d}:00:00", f"2023-10-15T{i:02d}:59:00") for i in range(20)
+    ]))
+    cache = MemoryRedis()
+    app.dependency_overrides[get_repository] = lambda: repo
+    app.dependency_overrides[get_redis] = lambda: cache
+    yield repo
+    app.dependency_overrides.clear()
+    repo.close()
+
+ROUTE = "/route?origin=DEL&destination=BOM&date=2023-10-15"
+
+def test_route_etag_and_304(client, repo):
+    first = client.get(ROUTE)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert len(first.json()) == 20
+
+    # Served from the cache entry: same bytes, same tag
+    again = client.get(ROUTE)
+    assert again.headers["etag"] == etag
+    assert again.content == first.content
+
+    not_modified = client.get(ROUTE, headers={"If-None-Match": f'"stale", {etag}'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+def test_route_compression(client, repo):
+    gzipped = client.get(ROUTE, headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in gzipped.headers["vary"]
+    assert len(gzipped.json()) == 20
+
+    plain = client.get(ROUTE, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    # Each coding has its own strong tag; either one revalidates, and the 304 echoes it
+    assert gzipped.headers["etag"] == coded_etag(plain.headers["etag"], "gzip")
+    for res, encoding in ((gzipped, "gzip"), (plain, "identity")):
+        revalidated = client.get(ROUTE, headers={"Accept-Encoding": encoding, "If-None-Match": res.headers["etag"]})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == res.headers["etag"]
+
+    # Below the threshold
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+def test_route_brotli(client, repo):
+    pytest.importorskip("brotli")
+    res = client.get(ROUTE, headers={"Accept-Encoding": "gzip, br"})
+    assert res.headers["content-encoding"] == "br"
+    assert res.headers["etag"].endswith('-br"')
+    assert len(res.json()) == 20
+
+def test_booking_etag_follows_status(client, repo):
+    now = "2023-10-15T10:00:00+00:00"
+    asyncio.run(repo.insert_booking({
+        "ref_id": "REF1", "user_id": None, "origin": "DEL", "destination": "BOM", "pieces": 1,
+        "weight_kg": 10, "status": "BOOKED", "flight_ids": [], "created_at": now, "updated_at": now,
+    }))
+    # The booking row is written before its first event: no validator yet
+    assert "etag" not in client.get("/bookings/REF1").headers
+
+    asyncio.run(repo.insert_booking_event({"booking_ref_id": "REF1", "status": "BOOKED", "timestamp": now}))
+    first = client.get("/bookings/REF1")
+    etag = first.headers["etag"]
+    assert client.get("/bookings/REF1", headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.post("/bookings/REF1/depart?location=DEL").status_code == 200
+    changed = client.get("/bookings/REF1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [e["status"] for e in changed.json()["events"]] == ["BOOKED", "DEPARTED"]
+
+    assert client.get("/bookings/MISSING", headers={"If-None-Match": etag}).status_code == 404
+
+def test_etag_helpers():
+    etag = make_etag("route", b"payload")
+    assert etag.startswith('"') and etag == make_etag("route", "payload")
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+    assert coded_etag(etag, "br") == f'{etag[:-1]}-br"'
+    assert etag_matches(coded_etag(etag, "gzip"), etag)
+    assert coded_etag(f"W/{etag}", "gzip") == f"W/{etag}"
+
+def test_encoding_negotiation():
+    assert accepted_encodings("gzip;q=0.5, br") == {"gzip": 0.5, "br": 1.0}
+    middleware = CompressionMiddleware(app=None)
+    assert middleware.choose_encoding("") == "identity"
+    assert middleware.choose_encoding("gzip, br;q=0") == "gzip"
+    assert middleware.choose_encoding("deflate") == "identity"
+
+def test_streamed_gzip_is_flushed_per_chunk():
+    responder = FlushingGZipResponder(app=None, minimum_size=0)
+    first = responder.apply_compression(b'{"processed":1000}\n', more_body=True)
+    last = responder.apply_compression(b'{"processed":2000}\n', more_body=False)
+    # The first chunk is decodable on its own, before the stream ends
+    assert gzip.decompress(first + last) == b'{"processed":1000}\n{"processed":2000}\n'
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(first) == b'{"processed":1000}\n'
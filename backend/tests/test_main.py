@@ -1,7 +1,7 @@
 
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 import sys
 import os
 
@@ -9,20 +9,35 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app, BookingStatus
+from db.repository import get_repository
+from db.clients import get_redis
+from db.supabase_repository import SupabaseRepository
 
 @pytest.fixture
 def client():
     return TestClient(app)
 
+class AsyncQueryMock(MagicMock):
+    """Query-builder mock whose `execute()` is awaitable, like the async Supabase client."""
+    def _get_child_mock(self, **kw):
+        if kw.get("name") == "execute":
+            return AsyncMock(**kw)
+        return AsyncQueryMock(**kw)
+
 @pytest.fixture
 def mock_supabase():
-    with patch("main.supabase") as mock:
-        yield mock
+    # Route the repository through a mocked Supabase client
+    mock = AsyncQueryMock()
+    app.dependency_overrides[get_repository] = lambda: SupabaseRepository(mock)
+    yield mock
+    app.dependency_overrides.pop(get_repository, None)
 
 @pytest.fixture
 def mock_redis():
-    with patch("main.redis") as mock:
-        yield mock
+    mock = AsyncMock()
+    app.dependency_overrides[get_redis] = lambda: mock
+    yield mock
+    app.dependency_overrides.pop(get_redis, None)
 
 @pytest.fixture
 def mock_verify_password():
@@ -105,6 +120,42 @@ def test_get_route_cache_hit(client, mock_redis):
     assert len(response.json()) == 1
     assert response.json()[0][0]["flight_id"] == "F1"
 
+def test_get_route_direct_and_transit(client, mock_redis):
+    # Route search over the embedded SQLite backend (direct + 1-stop legs fetched concurrently)
+    import asyncio
+    from db.sqlite_repository import SQLiteRepository
+
+    def flight(flight_id, origin, destination, dep, arr):
+        return {
+            "flight_id": flight_id,
+            "flight_number": flight_id,
+            "airline_name": "Air India",
+            "departure_datetime": dep,
+            "arrival_datetime": arr,
+            "origin": origin,
+            "destination": destination
+        }
+
+    repo = SQLiteRepository(":memory:")
+    asyncio.run(repo.insert_flights([
+        flight("D1", "DEL", "BOM", "2023-10-15T10:00:00", "2023-10-15T12:00:00"),
+        flight("L1", "DEL", "BLR", "2023-10-15T08:00:00", "2023-10-15T10:30:00"),
+        flight("L2", "BLR", "BOM", "2023-10-15T13:00:00", "2023-10-15T14:30:00"),
+        flight("L3", "BLR", "BOM", "2023-10-15T09:00:00", "2023-10-15T10:00:00"), # departs before L1 lands
+    ]))
+    mock_redis.get.return_value = None
+    app.dependency_overrides[get_repository] = lambda: repo
+
+    try:
+        response = client.get("/route?origin=DEL&destination=BOM&date=2023-10-15")
+        assert response.status_code == 200
+        routes = [[leg["flight_id"] for leg in route] for route in response.json()]
+        assert routes == [["D1"], ["L1", "L2"]]
+        mock_redis.set.assert_awaited_once()
+    finally:
+        app.dependency_overrides.pop(get_repository, None)
+        repo.close()
+
 
 # --- Booking Tests ---
 
@@ -234,3 +285,43 @@ def test_depart_arrive_flow(client, mock_supabase):
     resp_arrive = client.post("/bookings/REF123/arrive?location=BOM")
     assert resp_arrive.status_code == 200
     assert resp_arrive.json()["status"] == "ARRIVED"
+
+def test_create_booking_legs_over_sqlite(client):
+    # Repeated legs add up, and a failed leg stops the later ones from being reserved
+    import asyncio
+    from main import get_current_user
+    from db.memory_cache import MemoryRedis
+    from db.sqlite_repository import SQLiteRepository
+
+    def flight(flight_id, booked):
+        return {
+            "flight_id": flight_id, "flight_number": flight_id, "airline_name": "Air India",
+            "departure_datetime": "2023-10-15T10:00:00", "arrival_datetime": "2023-10-15T12:00:00",
+            "origin": "DEL", "destination": "BOM", "max_weight_kg": 5000, "booked_weight_kg": booked,
+        }
+
+    repo = SQLiteRepository(":memory:")
+    asyncio.run(repo.insert_flights([flight("F1", 1000), flight("F2", 4850), flight("F3", 1000)]))
+    asyncio.run(repo.insert_user({"id": "user123", "email": "test@test.com", "password": "x", "name": "Test"}))
+    cache = MemoryRedis()
+    app.dependency_overrides[get_repository] = lambda: repo
+    app.dependency_overrides[get_redis] = lambda: cache
+    app.dependency_overrides[get_current_user] = lambda: {"id": "user123", "email": "test@test.com"}
+
+    def booked(flight_id):
+        return asyncio.run(repo.get_flight(flight_id, columns="booked_weight_kg"))["booked_weight_kg"]
+
+    payload = {"origin": "DEL", "destination": "BOM", "pieces": 1, "weight_kg": 100}
+    try:
+        response = client.post("/bookings", json={**payload, "ref_id": "REF1", "flight_ids": ["F1", "F1"]})
+        assert response.status_code == 200
+        assert booked("F1") == 1200
+
+        # F2 is near full and another booking holds its lock
+        asyncio.run(cache.set("lock:flight:F2", "locked", nx=True, px=5000))
+        response = client.post("/bookings", json={**payload, "ref_id": "REF2", "flight_ids": ["F2", "F3"]})
+        assert response.status_code == 503
+        assert (booked("F2"), booked("F3")) == (4850, 1000)
+    finally:
+        app.dependency_overrides = {}
+        repo.close()
@@ -0,0 +1,44 @@
+import pytest
+import sys
+import os
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.memory_cache import MemoryRedis
+
+@pytest.mark.anyio
+async def test_get_set_delete():
+    cache = MemoryRedis()
+    assert await cache.get("k") is None
+    assert await cache.set("k", "v", ex=300) == "OK"
+    assert await cache.get("k") == "v"
+    assert await cache.delete("k", "missing") == 1
+    assert await cache.get("k") is None
+
+@pytest.mark.anyio
+async def test_set_nx_acts_as_lock():
+    cache = MemoryRedis()
+    assert await cache.set("lock:flight:F1", "locked", nx=True, px=5000) == "OK"
+    assert await cache.set("lock:flight:F1", "locked", nx=True, px=5000) is None
+    await cache.delete("lock:flight:F1")
+    assert await cache.set("lock:flight:F1", "locked", nx=True, px=5000) == "OK"
+
+@pytest.mark.anyio
+async def test_expiry():
+    cache = MemoryRedis()
+    await cache.set("k", "v", px=10)
+    await asyncio.sleep(0.02)
+    assert await cache.get("k") is None
+    # An expired lock can be taken again
+    assert await cache.set("k", "v", nx=True) == "OK"
+
+@pytest.mark.anyio
+async def test_sets_with_expiry():
+    cache = MemoryRedis()
+    assert await cache.sadd("idx", "a", "b") == 2
+    assert await cache.sadd("idx", "b", "c") == 1
+    assert sorted(await cache.smembers("idx")) == ["a", "b", "c"]
+    assert await cache.expire("idx", 0) == 1
+    assert await cache.smembers("idx") == []
+    assert await cache.expire("missing", 10) == 0
@@ -0,0 +1,37 @@
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.network import NetworkSpec, generate_network
+from benchmarks.bench_core import compare
+
+def test_network_is_deterministic():
+    spec = NetworkSpec(airports=8, hubs=2, days=2, flights_per_day=50, seed=7)
+    assert generate_network(spec) == generate_network(spec)
+    assert generate_network(spec) != generate_network(spec.model_copy(update={"seed": 8}))
+
+def test_network_shape():
+    spec = NetworkSpec(airports=10, hubs=2, hub_share=1.0, days=3, flights_per_day=100)
+    flights = generate_network(spec)
+    assert len(flights) == 300
+    assert len({f["flight_id"] for f in flights}) == 300
+
+    hubs = set(spec.airport_codes[:2])
+    for f in flights:
+        assert f["origin"] != f["destination"]
+        assert hubs & {f["origin"], f["destination"]}
+        assert f["arrival_datetime"] > f["departure_datetime"]
+        assert 0 <= f["booked_weight_kg"] <= f["max_weight_kg"]
+
+def test_network_rejects_too_many_airports():
+    with pytest.raises(ValueError):
+        generate_network(NetworkSpec(airports=1000))
+
+def test_compare_flags_regressions():
+    baseline = {"small": {"route_search": {"median_ms": 10.0}, "timeline_read": {"median_ms": 2.0}}}
+    results = {"small": {"flights": 700, "route_search": {"median_ms": 16.0}, "timeline_read": {"median_ms": 2.5}}}
+    regressions = compare(results, baseline, tolerance=0.5)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("small/route_search")
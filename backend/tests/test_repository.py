@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.sqlite_repository import SQLiteRepository
+
+FLIGHTS = [
+    {
+        "flight_id": "F1",
+        "flight_number": "AI101",
+        "airline_name": "Air India",
+        "departure_datetime": "2023-10-15T10:00:00",
+        "arrival_datetime": "2023-10-15T12:00:00",
+        "origin": "DEL",
+        "destination": "BOM",
+        "max_weight_kg": 5000,
+        "booked_weight_kg": 1000,
+        "base_price_per_kg": 5.0
+    },
+    {
+        "flight_id": "F2",
+        "flight_number": "AI202",
+        "airline_name": "Air India",
+        "departure_datetime": "2023-10-15T09:00:00+00:00",
+        "arrival_datetime": "2023-10-15T11:00:00+00:00",
+        "origin": "DEL",
+        "destination": "BLR",
+        "max_weight_kg": 5000,
+        "booked_weight_kg": 0,
+        "base_price_per_kg": 4.5
+    },
+    {
+        "flight_id": "F3",
+        "flight_number": "AI303",
+        "airline_name": "Air India",
+        "departure_datetime": "2023-10-16T09:00:00",
+        "arrival_datetime": "2023-10-16T11:00:00",
+        "origin": "DEL",
+        "destination": "BOM",
+        "max_weight_kg": 5000,
+        "booked_weight_kg": 0,
+        "base_price_per_kg": 4.5
+    },
+]
+
+@pytest.fixture
+def repo():
+    repo = SQLiteRepository(":memory:")
+    asyncio.run(repo.insert_flights(FLIGHTS))
+    yield repo
+    repo.close()
+
+def _day(d):
+    return datetime.combine(d, datetime.min.time()), datetime.combine(d, datetime.max.time())
+
+@pytest.mark.anyio
+async def test_search_flights_by_window(repo):
+    start, end = _day(datetime(2023, 10, 15).date())
+
+    all_legs = await repo.search_flights("DEL", start, end)
+    assert [f["flight_id"] for f in all_legs] == ["F2", "F1"]
+
+    direct = await repo.search_flights("DEL", start, end, destination="BOM")
+    assert [f["flight_id"] for f in direct] == ["F1"]
+
+@pytest.mark.anyio
+async def test_list_flights_departing(repo):
+    start, _ = _day(datetime(2023, 10, 15).date())
+    _, end = _day(datetime(2023, 10, 16).date())
+    rows = await repo.list_flights_departing(start, end, columns="flight_id, departure_datetime")
+    assert [f["flight_id"] for f in rows] == ["F2", "F1", "F3"]
+    assert rows[0]["departure_datetime"] == "2023-10-15T09:00:00.000000+00:00"
+
+    _, end = _day(datetime(2023, 10, 15).date())
+    assert len(await repo.list_flights_departing(start, end)) == 2
+
+@pytest.mark.anyio
+async def test_inline_reads_do_not_wait_for_a_range_scan():
+    repo = SQLiteRepository(":memory:")
+    await repo.insert_flights([
+        {**FLIGHTS[0], "flight_id": f"S{i}", "departure_datetime": f"2023-10-{1 + i % 28:02d}T{i % 24:02d}:00:00"}
+        for i in range(40000)
+    ])
+    start, end = datetime(2023, 10, 1, tzinfo=timezone.utc), datetime(2023, 10, 31, tzinfo=timezone.utc)
+    scan = asyncio.ensure_future(repo.list_flights_departing(start, end))
+    await asyncio.sleep(0.005)
+    waits = []
+    while not scan.done():
+        began = asyncio.get_running_loop().time()
+        assert (await repo.get_flight("S1"))["flight_id"] == "S1"
+        waits.append(asyncio.get_running_loop().time() - began)
+        await asyncio.sleep(0.002)
+    assert len(await scan) == 40000
+    # The scan takes the connection lock per chunk, so reads on the loop never wait for the whole scan
+    assert waits and max(waits) < 0.15
+    repo.close()
+
+def test_search_flights_uses_index(repo):
+    plan = repo._fetchall(
+        "EXPLAIN QUERY PLAN SELECT * FROM flights WHERE origin = ? AND departure_datetime >= ?",
+        ("DEL", "2023-10-15"),
+    )
+    assert "idx_flights_origin" in " ".join(row["detail"] for row in plan)
+
+@pytest.mark.anyio
+async def test_update_booked_weight(repo):
+    await repo.update_flight_booked_weight("F1", 1500)
+    assert await repo.get_flight("F1", columns="max_weight_kg, booked_weight_kg") == {
+        "max_weight_kg": 5000,
+        "booked_weight_kg": 1500
+    }
+    assert await repo.get_flight("missing") is None
+
+@pytest.mark.anyio
+async def test_booking_and_events_roundtrip(repo):
+    user = await repo.insert_user({"email": "a@b.com", "password": "x", "name": "A"})
+    now = datetime.now(timezone.utc).isoformat()
+    booking = await repo.insert_booking({
+        "ref_id": "REF1",
+        "user_id": user["id"],
+        "origin": "DEL",
+        "destination": "BOM",
+        "pieces": 1,
+        "weight_kg": 10,
+        "status": "BOOKED",
+        "flight_ids": ["F1"],
+        "created_at": now,
+        "updated_at": now
+    })
+    assert booking["flight_ids"] == ["F1"]
+    assert (await repo.list_user_bookings(user["id"]))[0]["ref_id"] == "REF1"
+
+    await repo.insert_booking_event({"booking_ref_id": "REF1", "status": "DEPARTED", "timestamp": "2023-10-15T11:00:00"})
+    await repo.insert_booking_event({"booking_ref_id": "REF1", "status": "BOOKED", "timestamp": "2023-10-15T10:00:00",
+                                     "metadata": {"message": "Booking created"}})
+    events = await repo.list_booking_events("REF1")
+    assert [e["status"] for e in events] == ["BOOKED", "DEPARTED"]
+    assert events[0]["metadata"] == {"message": "Booking created"}
+
+    await repo.update_booking_status("REF1", "DEPARTED", now)
+    assert (await repo.get_booking("REF1"))["status"] == "DEPARTED"
+
+@pytest.mark.anyio
+async def test_duplicate_user_email(repo):
+    await repo.insert_user({"email": "a@b.com", "password": "x", "name": "A"})
+    assert (await repo.get_user_by_email("a@b.com", columns="id"))["id"]
+    with pytest.raises(ValueError):
+        await repo.insert_user({"email": "a@b.com", "password": "y", "name": "B"})
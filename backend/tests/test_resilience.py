@@ -0,0 +1,270 @@
+import asyncio
+import time
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+from upstash_redis.errors import UpstashError
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resilience
+from main import app, create_app, get_current_user
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, DependencyTimeout, ResilienceSettings, ResilientStore
+from db.repository import get_repository
+from db.clients import get_redis
+from db.memory_cache import MemoryRedis
+from db.sqlite_repository import SQLiteRepository
+
+FLIGHT = {
+    "flight_id": "F1", "flight_number": "AI101", "airline_name": "Air India",
+    "departure_datetime": "2023-10-15T10:00:00", "arrival_datetime": "2023-10-15T12:00:00",
+    "origin": "DEL", "destination": "BOM",
+}
+ROUTE = "/route?origin=DEL&destination=BOM&date=2023-10-15"
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class DownCache:
+    """A cache whose every command fails like an unreachable Upstash."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def _fail(self):
+        self.calls += 1
+        raise ConnectionError("Upstash unreachable")
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self._fail()
+
+class SlowStore:
+    """Answers any call after `delays[i]` seconds on the i-th call (the last delay repeats)."""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.calls = 0
+
+    async def _answer(self):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        return f"value-{self.calls}"
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self._answer()
+
+class FailingRelease(MemoryRedis):
+    """Locks work, but every DEL fails."""
+
+    async def delete(self, *keys):
+        raise ConnectionError("Upstash unreachable")
+
+@pytest.fixture
+def repo():
+    repo = SQLiteRepository(":memory:")
+    asyncio.run(repo.insert_flights([FLIGHT]))
+    yield repo
+    app.dependency_overrides.clear()
+    repo.close()
+
+def test_breaker_opens_and_recovers():
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_s=5, clock=clock)
+    breaker.allow()
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_success()
+    # Only consecutive failures count
+    for _ in range(2):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.allow()
+    assert e.value.retry_after_s == 5
+
+    clock.now = 5
+    assert breaker.state == "half_open"
+    breaker.allow()
+    # One probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 10
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": "closed", "consecutive_failures": 0}
+
+def test_route_skips_failing_cache(repo):
+    cache = DownCache()
+    breaker = CircuitBreaker("redis", failure_threshold=2)
+    guarded = ResilientStore(cache, "redis", ResilienceSettings(), breaker)
+    app.dependency_overrides[get_repository] = lambda: repo
+    app.dependency_overrides[get_redis] = lambda: guarded
+    client = TestClient(app)
+
+    # The failed lookup and cache writes of the first request open the circuit
+    assert client.get(ROUTE).status_code == 200
+    assert breaker.state == "open"
+    calls = cache.calls
+    # Later requests are served from the database without touching the cache
+    for _ in range(3):
+        res = client.get(ROUTE)
+        assert res.status_code == 200
+        assert [[leg["flight_id"] for leg in route] for route in res.json()] == [["F1"]]
+    assert cache.calls == calls
+
+def test_open_circuit_is_503(repo):
+    breaker = CircuitBreaker("supabase", failure_threshold=1)
+    breaker.allow()
+    breaker.record_failure()
+    app.dependency_overrides[get_repository] = lambda: ResilientStore(repo, "supabase", ResilienceSettings(), breaker)
+    res = TestClient(app).get("/bookings/REF1")
+    assert res.status_code == 503
+    assert res.headers["retry-after"] == "10"
+
+@pytest.mark.anyio
+async def test_call_timeout_counts_as_failure():
+    breaker = CircuitBreaker("redis", failure_threshold=1)
+    store = ResilientStore(SlowStore(0.5), "redis", ResilienceSettings(timeout_ms=20), breaker)
+    start = time.perf_counter()
+    with pytest.raises(DependencyTimeout):
+        await store.get("k")
+    assert time.perf_counter() - start < 0.3
+    assert breaker.state == "open"
+
+@pytest.mark.anyio
+async def test_deadline_bounds_calls_without_tripping_the_breaker():
+    breaker = CircuitBreaker("supabase", failure_threshold=1)
+    store = ResilientStore(SlowStore(0.5), "supabase", ResilienceSettings(), breaker)
+    with resilience.deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            await store.get("k")
+        await asyncio.sleep(0.05)
+        # No budget left: the call is not even sent
+        with pytest.raises(DeadlineExceeded):
+            await store.get("k")
+    assert store._inner.calls == 1
+    assert breaker.state == "closed"
+
+def test_request_deadline_is_504(repo, monkeypatch):
+    monkeypatch.setenv("REQUEST_DEADLINE_MS", "50")
+    deadline_app = create_app()
+    store = ResilientStore(SlowStore(0.5), "supabase", ResilienceSettings(), CircuitBreaker("supabase"))
+    deadline_app.dependency_overrides[get_repository] = lambda: store
+    res = TestClient(deadline_app).get("/bookings/REF1")
+    assert res.status_code == 504
+
+@pytest.mark.anyio
+async def test_business_errors_do_not_trip_the_breaker(repo):
+    breaker = CircuitBreaker("supabase", failure_threshold=1)
+    store = ResilientStore(repo, "supabase", ResilienceSettings(), breaker)
+    await store.insert_user({"email": "a@b.com", "password": "x", "name": "A"})
+    with pytest.raises(ValueError):
+        await store.insert_user({"email": "a@b.com", "password": "y", "name": "B"})
+    assert breaker.state == "closed"
+
+def status_error(status):
+    request = httpx.Request("POST", "https://cache.example.com")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+@pytest.mark.parametrize("error, failure", [
+    (ConnectionError("refused"), True),
+    (status_error(503), True),
+    (status_error(404), False),
+    (APIError({"code": 502, "message": "JSON could not be generated"}), True),
+    (APIError({"code": "PGRST002", "message": "Could not query the database for the schema cache"}), True),
+    (APIError({"code": "57014", "message": "canceling statement due to statement timeout"}), True),
+    (APIError({"code": "23505", "message": "duplicate key value violates unique constraint"}), False),
+    (APIError({"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned"}), False),
+    (UpstashError("ERR wrong number of arguments"), False),
+    (ValueError("Email already registered"), False),
+])
+def test_is_failure(error, failure):
+    assert resilience.is_failure(error) is failure
+
+@pytest.mark.anyio
+async def test_server_errors_trip_the_breaker():
+    class Erroring:
+        async def get(self, key):
+            raise APIError({"code": 503, "message": "JSON could not be generated"})
+
+    breaker = CircuitBreaker("supabase", failure_threshold=1)
+    store = ResilientStore(Erroring(), "supabase", ResilienceSettings(), breaker)
+    with pytest.raises(APIError):
+        await store.get("k")
+    assert breaker.state == "open"
+
+@pytest.mark.anyio
+async def test_hedged_reads():
+    slow_first = SlowStore(1.0, 0.0)
+    store = ResilientStore(slow_first, "supabase", ResilienceSettings(hedge_after_ms=20), CircuitBreaker("supabase"))
+    start = time.perf_counter()
+    # The second attempt answers first
+    assert await store.get("k") == "value-2"
+    assert time.perf_counter() - start < 0.5
+
+    # Fast answers are not hedged
+    fast = SlowStore(0.0)
+    store = ResilientStore(fast, "supabase", ResilienceSettings(hedge_after_ms=20), CircuitBreaker("supabase"))
+    await store.get("k")
+    assert fast.calls == 1
+
+    # Writes are never sent twice
+    slow = SlowStore(0.1)
+    store = ResilientStore(slow, "supabase", ResilienceSettings(hedge_after_ms=20), CircuitBreaker("supabase"))
+    await store.set("k", "v")
+    assert slow.calls == 1
+
+@pytest.mark.anyio
+async def test_lock_commands_use_the_lock_timeout():
+    store = ResilientStore(SlowStore(0.1), "redis", ResilienceSettings(timeout_ms=20, lock_timeout_ms=500), CircuitBreaker("redis"))
+    with pytest.raises(DependencyTimeout):
+        await store.set("k", "v")
+    assert await resilience.lock_client(store).set("lock:k", "locked", nx=True, px=5000) == "value-2"
+    cache = MemoryRedis()
+    assert resilience.lock_client(cache) is cache
+
+BOOKING = {"ref_id": "REF1", "origin": "DEL", "destination": "BOM", "pieces": 1, "weight_kg": 100}
+
+def test_failed_lock_release_keeps_the_booking(repo):
+    # F1 (5000kg, none booked) is in the lock zone for a 4950kg booking
+    asyncio.run(repo.insert_user({"id": "user123", "email": "a@b.com", "password": "x", "name": "A"}))
+    app.dependency_overrides[get_repository] = lambda: repo
+    app.dependency_overrides[get_redis] = lambda: FailingRelease()
+    app.dependency_overrides[get_current_user] = lambda: {"id": "user123", "email": "a@b.com"}
+    res = TestClient(app).post("/bookings", json={**BOOKING, "weight_kg": 4950, "flight_ids": ["F1"]})
+    assert res.status_code == 200
+    assert asyncio.run(repo.get_flight("F1", columns="booked_weight_kg"))["booked_weight_kg"] == 4950
+
+@pytest.mark.parametrize("error, status", [(CircuitOpenError("supabase", 3), 503), (DeadlineExceeded("out of time"), 504)])
+def test_booking_insert_unavailable_is_not_400(repo, error, status):
+    class Unavailable:
+        async def insert_booking(self, booking):
+            raise error
+
+    app.dependency_overrides[get_repository] = lambda: Unavailable()
+    app.dependency_overrides[get_current_user] = lambda: {"id": "user123", "email": "a@b.com"}
+    res = TestClient(app).post("/bookings", json=BOOKING)
+    assert res.status_code == status
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("TEST_RESILIENCE_HEDGE_AFTER_MS", "80")
+    settings = ResilienceSettings.from_env("TEST_RESILIENCE_", timeout_ms=250)
+    assert (settings.hedge_after_ms, settings.timeout_ms, settings.failure_threshold) == (80, 250, 5)
+
+def test_dependency_health():
+    # Breakers are shared per dependency and listed once used
+    assert resilience.breaker_for("redis") is resilience.breaker_for("redis")
+    states = TestClient(app).get("/health/dependencies").json()
+    assert states["redis"] == {"state": "closed", "consecutive_failures": 0}
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import pytest
+from datetime import date
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db.repository
+import route_cache
+import schedule_import
+from main import app, get_current_user
+from db.repository import get_repository
+from db.clients import get_redis
+from db.memory_cache import MemoryRedis
+from db.sqlite_repository import SQLiteRepository
+
+CSV = """flight_id,flight_number,airline_name,departure_datetime,arrival_datetime,origin,destination,max_weight_kg,base_price_per_kg
+F1,AI101,Air India,2023-10-15T10:00:00,2023-10-15T12:00:00,DEL,BOM,5000,5.0
+F2,AI202,Air India,2023-10-15T08:00:00,2023-10-15T10:30:00,DEL,BLR,,4.5
+
+F3,AI303,Air India,not-a-date,2023-10-15T14:30:00,BLR,BOM,5000,4.0
+F4,AI404,Air India,2023-10-15T13:00:00,2023-10-15T14:30:00,BLR,BOM,5000,
+F5,AI505,Air India,2023-10-16T09:00:00,2023-10-16T11:00:00,BOM,DEL,4000,6.0
+"""
+
+async def chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+async def collect(aiter):
+    return [item async for item in aiter]
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.fixture
+def stores(monkeypatch):
+    monkeypatch.setenv("OPERATOR_EMAILS", "admin@example.com, ops@example.com")
+    repo = SQLiteRepository(":memory:")
+    cache = MemoryRedis()
+    app.dependency_overrides[get_repository] = lambda: repo
+    app.dependency_overrides[get_redis] = lambda: cache
+    app.dependency_overrides[get_current_user] = lambda: {"id": "ops", "email": "ops@example.com"}
+    yield repo, cache
+    app.dependency_overrides.clear()
+    repo.close()
+
+def post_schedule(client, body, fmt="csv", batch_size=2):
+    res = client.post(f"/flights/import?format={fmt}&batch_size={batch_size}", content=body)
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in res.text.splitlines()]
+
+@pytest.mark.anyio
+async def test_iter_lines_across_chunks():
+    data = "﻿a,b\r\nDélhi,2\nlast".encode("utf-8")
+    # One-byte chunks split the BOM, the CRLF and the two-byte é
+    assert await collect(schedule_import.iter_lines(chunks(data, 1))) == ["a,b", "Délhi,2", "last"]
+
+@pytest.mark.anyio
+async def test_parse_records():
+    lines = chunks(b'a,b\n1,"x,y"\n\n2\n3,\n', 4)
+    records = await collect(schedule_import.parse_records(schedule_import.iter_lines(lines), "csv"))
+    assert records == [(2, {"a": "1", "b": "x,y"}), (4, "Expected 2 fields, got 1"), (5, {"a": "3"})]
+
+    lines = chunks(b'{"a": 1}\n[1]\n{bad\n', 100)
+    records = await collect(schedule_import.parse_records(schedule_import.iter_lines(lines), "ndjson"))
+    assert records[0] == (1, {"a": 1})
+    assert records[1] == (2, "Expected a JSON object")
+    assert records[2][1].startswith("Invalid JSON")
+
+def test_import_csv_in_batches(client, stores):
+    repo, _ = stores
+    progress = post_schedule(client, CSV)
+
+    # 5 data rows in batches of 2; the last line carries the totals
+    assert [(p["batches"], p["done"]) for p in progress] == [(1, False), (2, False), (3, True)]
+    final = progress[-1]
+    assert final["done"] and final["failed"] is None
+    assert (final["processed"], final["created"], final["rejected"]) == (5, 4, 1)
+    assert final["errors"][0]["line"] == 5 and "departure_datetime" in final["errors"][0]["error"]
+
+    f2 = asyncio.run(repo.get_flight("F2"))
+    # Empty fields take the model defaults
+    assert (f2["max_weight_kg"], f2["booked_weight_kg"]) == (5000, 0)
+    assert asyncio.run(repo.get_flight("F4"))["base_price_per_kg"] == 5.0
+
+def test_reimport_keeps_booked_weight(client, stores):
+    repo, _ = stores
+    post_schedule(client, CSV)
+    asyncio.run(repo.update_flight_booked_weight("F1", 1200))
+
+    # F1 re-priced (and claims no bookings), the rest unchanged
+    changed = CSV.replace("DEL,BOM,5000,5.0", "DEL,BOM,5000,7.5")
+    rows = "\n".join(line + ",0" if i else line + ",booked_weight_kg" for i, line in enumerate(changed.strip().splitlines()) if line)
+    final = post_schedule(client, rows, batch_size=100)[-1]
+    assert (final["created"], final["updated"], final["unchanged"]) == (0, 1, 3)
+
+    f1 = asyncio.run(repo.get_flight("F1"))
+    assert (f1["base_price_per_kg"], f1["booked_weight_kg"]) == (7.5, 1200)
+
+def test_import_invalidates_affected_routes(client, stores):
+    _, cache = stores
+    post_schedule(client, CSV)
+    searches = {
+        "DEL-BOM": "/route?origin=DEL&destination=BOM&date=2023-10-15",
+        "BOM-DEL": "/route?origin=BOM&destination=DEL&date=2023-10-16",
+    }
+    for url in searches.values():
+        assert client.get(url).status_code == 200
+    before = client.get(searches["DEL-BOM"]).json()
+    assert [[leg["flight_id"] for leg in route] for route in before] == [["F1"], ["F2", "F4"]]
+
+    # New second leg BLR -> BOM: only searches ending in BOM are affected
+    ndjson = json.dumps({
+        "flight_id": "F6", "flight_number": "AI606", "airline_name": "Air India",
+        "departure_datetime": "2023-10-15T16:00:00Z", "arrival_datetime": "2023-10-15T17:30:00Z",
+        "origin": "BLR", "destination": "BOM",
+    })
+    final = post_schedule(client, ndjson, fmt="ndjson")[-1]
+    assert final["created"] == 1
+
+    assert asyncio.run(cache.get(route_cache.route_key("DEL", "BOM", date(2023, 10, 15)))) is None
+    assert asyncio.run(cache.get(route_cache.route_key("BOM", "DEL", date(2023, 10, 16)))) is not None
+    after = client.get(searches["DEL-BOM"]).json()
+    assert [[leg["flight_id"] for leg in route] for route in after] == [["F1"], ["F2", "F4"], ["F2", "F6"]]
+
+@pytest.mark.anyio
+async def test_store_route_expires_index_after_adding():
+    class RecordingCache(MemoryRedis):
+        def __init__(self):
+            super().__init__()
+            self.commands = []
+
+        async def sadd(self, key, *members):
+            await asyncio.sleep(0)
+            self.commands.append(("sadd", key))
+            return await super().sadd(key, *members)
+
+        async def expire(self, key, seconds):
+            self.commands.append(("expire", key))
+            return await super().expire(key, seconds)
+
+    cache = RecordingCache()
+    await route_cache.store_route(cache, "DEL", "BOM", date(2023, 10, 15), "[]")
+    for index in (route_cache.origin_index("DEL", date(2023, 10, 15)), route_cache.destination_index("BOM", date(2023, 10, 15))):
+        assert cache.commands.index(("sadd", index)) < cache.commands.index(("expire", index))
+        # An EXPIRE sent before the set exists is a no-op and leaves it without a TTL
+        assert cache._data[index][1] is not None
+
+def test_import_format_errors(client, stores):
+    assert client.post("/flights/import", content=CSV).status_code == 400
+    res = client.post("/flights/import", content=CSV, headers={"Content-Type": "text/csv"})
+    assert res.status_code == 200
+
+def test_import_requires_operator(client, stores):
+    repo, _ = stores
+    app.dependency_overrides[get_current_user] = lambda: {"id": "user123", "email": "shipper@example.com"}
+    res = client.post("/flights/import?format=csv", content=CSV)
+    assert res.status_code == 403
+    assert asyncio.run(repo.get_flight("F1")) is None
+
+def test_format_for():
+    assert schedule_import.format_for("text/csv; charset=utf-8") == "csv"
+    assert schedule_import.format_for(None, "winter.jsonl") == "ndjson"
+    assert schedule_import.format_for("application/json", "schedule.txt") is None
+
+@pytest.mark.anyio
+async def test_cli_imports_file(tmp_path, monkeypatch):
+    path = tmp_path / "schedule.csv"
+    path.write_text(CSV)
+    repo = SQLiteRepository(":memory:")
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("CACHE_BACKEND", "memory")
+    monkeypatch.setattr(db.repository, "_sqlite_repository", repo)
+
+    args = schedule_import.build_parser().parse_args([str(path), "--batch-size", "3"])
+    progress = await schedule_import.main_async(args)
+    assert (progress.batches, progress.created, progress.rejected) == (2, 4, 1)
+    assert len(await repo.list_flights(["F1", "F5", "missing"])) == 2
+    repo.close()
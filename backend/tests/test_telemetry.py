@@ -0,0 +1,141 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telemetry
+from main import app, get_current_user, reserve_capacity
+from db.repository import get_repository
+from db.clients import get_redis
+from db.memory_cache import MemoryRedis
+from db.sqlite_repository import SQLiteRepository
+from telemetry import InstrumentedStore
+
+FLIGHTS = [
+    {"flight_id": "D1", "flight_number": "D1", "airline_name": "Air India", "origin": "DEL", "destination": "BOM",
+     "departure_datetime": "2023-10-15T10:00:00", "arrival_datetime": "2023-10-15T12:00:00"},
+    {"flight_id": "L1", "flight_number": "L1", "airline_name": "Air India", "origin": "DEL", "destination": "BLR",
+     "departure_datetime": "2023-10-15T08:00:00", "arrival_datetime": "2023-10-15T10:30:00"},
+    {"flight_id": "L2", "flight_number": "L2", "airline_name": "Air India", "origin": "BLR", "destination": "BOM",
+     "departure_datetime": "2023-10-15T13:00:00", "arrival_datetime": "2023-10-15T14:30:00"},
+    {"flight_id": "FULL", "flight_number": "FULL", "airline_name": "Air India", "origin": "DEL", "destination": "BOM",
+     "departure_datetime": "2023-10-15T18:00:00", "arrival_datetime": "2023-10-15T20:00:00",
+     "max_weight_kg": 100, "booked_weight_kg": 95},
+]
+
+pytestmark = pytest.mark.skipif(
+    telemetry.memory_span_exporter is None or telemetry.memory_metric_reader is None,
+    reason="needs OTEL_TRACES_EXPORTER=memory and OTEL_METRICS_EXPORTER=memory",
+)
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+@pytest.fixture
+def stores():
+    repo = SQLiteRepository(":memory:")
+    asyncio.run(repo.insert_flights(FLIGHTS))
+    cache = MemoryRedis()
+    app.dependency_overrides[get_repository] = lambda: InstrumentedStore(repo, "sqlite", counts_as_query=True)
+    app.dependency_overrides[get_redis] = lambda: InstrumentedStore(cache, "memory")
+    telemetry.memory_span_exporter.clear()
+    yield repo, cache
+    app.dependency_overrides.clear()
+    repo.close()
+
+def points(name, **attributes):
+    """Data points of a metric whose attributes include `attributes`."""
+    data = telemetry.memory_metric_reader.get_metrics_data()
+    found = []
+    for resource_metrics in (data.resource_metrics if data else []):
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                if metric.name == name:
+                    found += [p for p in metric.data.data_points
+                              if all(p.attributes.get(k) == v for k, v in attributes.items())]
+    return found
+
+def total(name, **attributes):
+    # Sum for counters, number of recordings for histograms
+    return sum(getattr(p, "count", None) or getattr(p, "value", 0) for p in points(name, **attributes))
+
+def test_route_spans_and_query_count(client, stores):
+    misses = total("route.cache.lookups", result="miss")
+    hits = total("route.cache.lookups", result="hit")
+    miss_queries = sum(p.sum for p in points("route.queries", **{"route.cache.result": "miss"}))
+    hit_requests = total("route.queries", **{"route.cache.result": "hit"})
+
+    for _ in range(2):
+        response = client.get("/route?origin=DEL&destination=BOM&date=2023-10-15")
+        assert response.status_code == 200
+
+    assert total("route.cache.lookups", result="miss") == misses + 1
+    assert total("route.cache.lookups", result="hit") == hits + 1
+    # Miss: direct + first legs + one second-leg lookup (via BLR); hit: no queries
+    assert sum(p.sum for p in points("route.queries", **{"route.cache.result": "miss"})) == miss_queries + 3
+    assert total("route.queries", **{"route.cache.result": "hit"}) == hit_requests + 1
+    assert points("route.cache.hit_ratio")
+
+    spans = telemetry.memory_span_exporter.get_finished_spans()
+    server_spans = [s for s in spans if s.name == "GET /route"]
+    searches = [s for s in spans if s.name == "sqlite search_flights"]
+    assert len(server_spans) == 2 and len(searches) == 3
+    # Store calls are children of the first request's span
+    assert {s.parent.span_id for s in searches} == {server_spans[0].context.span_id}
+    assert any(s.name == "memory set" for s in spans)
+    assert total("datastore.operation.duration", **{"db.system": "sqlite", "db.operation.name": "search_flights"}) >= 3
+
+def test_capacity_failure_is_counted(client, stores):
+    failures = total("booking.capacity.failures", stage="precheck")
+    app.dependency_overrides[get_current_user] = lambda: {"id": None, "email": "test@test.com"}
+
+    response = client.post("/bookings", json={
+        "ref_id": "REF-FULL", "origin": "DEL", "destination": "BOM",
+        "pieces": 1, "weight_kg": 10, "flight_ids": ["FULL"]
+    })
+    assert response.status_code == 400
+    assert total("booking.capacity.failures", stage="precheck") == failures + 1
+
+@pytest.mark.anyio
+async def test_lock_contention_and_wait(stores):
+    repo, cache = stores
+    await cache.set("lock:flight:FULL", "locked", px=5000)
+    contention = total("booking.lock.contention")
+    failed_waits = total("booking.lock.wait", acquired=False)
+
+    with patch("main.asyncio.sleep", new=AsyncMock()):
+        with pytest.raises(HTTPException) as exc:
+            await reserve_capacity(repo, cache, "FULL", 100, 95, 5)
+    assert exc.value.status_code == 503
+    assert total("booking.lock.contention") == contention + 5
+    assert total("booking.lock.wait", acquired=False) == failed_waits + 1
+
+@pytest.mark.anyio
+async def test_instrumented_store_passes_through():
+    cache = InstrumentedStore(MemoryRedis(), "memory")
+    assert await cache.set("k", "v", ex=10) == "OK"
+    assert await cache.get("k") == "v"
+    # Non-awaitable attributes are returned as-is
+    assert isinstance(cache._data, dict)
+
+def test_exporter_defaults(monkeypatch):
+    for name in ("OTEL_SDK_DISABLED", "OTEL_TRACES_EXPORTER", "OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.delenv("OTEL_EXPORTER_OTLP_ENDPOINT", raising=False)
+    assert telemetry.exporter_name("TRACES") == "none"
+    monkeypatch.setenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://collector:4318/v1/traces")
+    assert telemetry.exporter_name("TRACES") == "otlp"
+    monkeypatch.setenv("OTEL_SDK_DISABLED", "true")
+    assert telemetry.exporter_name("TRACES") == "none"
+
+def test_sampler_settings():
+    sampler = telemetry._sampler("parentbased_traceidratio", "0.25")
+    assert "TraceIdRatioBased{0.25}" in sampler.get_description()
+    with pytest.raises(ValueError):
+        telemetry._sampler("sometimes", None)
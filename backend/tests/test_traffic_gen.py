@@ -0,0 +1,58 @@
+import asyncio
+import httpx
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from traffic_gen import EndpointStats, LoadGenerator, build_parser, parse_mix, percentile
+
+def test_parse_mix():
+    assert parse_mix("search=70,booking=10, tracking=15,login=5") == {
+        "search": 70.0, "booking": 10.0, "tracking": 15.0, "login": 5.0
+    }
+    with pytest.raises(ValueError):
+        parse_mix("search=50,checkout=50")
+
+def test_percentile():
+    values = sorted(float(v) for v in range(1, 101))
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+def test_endpoint_summary():
+    stats = EndpointStats()
+    for latency in (0.5, 3.0, 3.0, 40.0):
+        stats.record(latency, 200, True)
+    stats.record(20000.0, None, False)
+
+    summary = stats.summary(elapsed_s=2.0)
+    assert summary["requests"] == 5
+    assert summary["errors"] == 1
+    assert summary["error_rate"] == 0.2
+    assert summary["throughput_rps"] == 2.5
+    assert summary["histogram"]["le_1ms"] == 1
+    assert summary["histogram"]["le_5ms"] == 2
+    assert summary["histogram"]["le_50ms"] == 1
+    assert summary["histogram"]["gt_10000ms"] == 1
+    assert summary["status_codes"] == {"0": 1, "200": 4}
+
+@pytest.mark.anyio
+async def test_requests_left_at_drain_timeout_are_timeouts():
+    async def handler(request):
+        if request.url.path == "/users/signup":
+            return httpx.Response(200, json={"access_token": "t"})
+        # Logins never answer
+        await asyncio.sleep(60)
+
+    args = build_parser().parse_args(["--mix", "login=1", "--users", "1", "--rate", "50", "--duration", "0.1", "--drain-timeout", "0.1"])
+    async with httpx.AsyncClient(base_url="http://test", transport=httpx.MockTransport(handler)) as client:
+        report = await LoadGenerator(client, args).run()
+
+    login = report["endpoints"]["POST /users/login"]
+    assert login["requests"] > 0
+    assert login["timeouts"] == login["errors"] == login["requests"]
+    assert login["status_codes"] == {"0": login["requests"]}
+    assert login["latency_ms"]["max"] >= 100
+    assert report["total"]["timeouts"] == login["requests"]
@@ -1,23 +1,385 @@
+"""
+Async load generator for the GoComet backend.
+
+Open-loop: requests arrive as a Poisson process at --rate per second, independent
+of how fast the server answers, and latency is measured from each request's
+scheduled arrival so queueing delay is not hidden. Each arrival belongs to one of
+--users virtual users and picks an operation from the request mix.
+
+Examples:
+    # Self-contained run on local stand-ins (SQLite + in-process cache)
+    python traffic_gen.py --local --rate 200 --duration 30 --output report.json
+
+    # Against a running server
+    python traffic_gen.py --base-url http://127.0.0.1:8000 --mix search=80,booking=10,tracking=10
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
 import time
-import requests
-
-print("Starting traffic generator...")
-print("Press Ctrl+C to stop.")
-
-success_count = 0
-fail_count = 0
-
-while True:
-    try:
-        # Hit Health
-        requests.get("http://127.0.0.1:8000/health")
-        
-        # Hit Route Search (triggers spans)
-        requests.get("http://127.0.0.1:8000/route?origin=DEL&destination=BOM&date=2024-01-20")
-        
-        success_count += 2
-        print(f"\rRequests Sent: {success_count} | Failures: {fail_count}", end="", flush=True)
-    except Exception as e:
-        fail_count += 1
-    
-    time.sleep(2) # Wait 2 seconds between bursts
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.network import NetworkSpec, generate_network
+
+DEFAULT_MIX = "search=70,booking=10,tracking=15,login=5"
+# Latency histogram bucket upper bounds (ms)
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+TRACKING_STEPS = ["depart", "arrive", "deliver"]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("search", "booking", "tracking", "login"):
+            raise ValueError(f"Unknown operation in mix: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        # Requests cancelled at --drain-timeout (also counted as errors)
+        self.timeouts = 0
+        self.status_codes: Dict[int, int] = {}
+
+    def record(self, latency_ms: float, status_code: Optional[int], ok: bool, timed_out: bool = False):
+        self.latencies_ms.append(latency_ms)
+        key = status_code if status_code is not None else 0 # 0 = no response (transport error or timeout)
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        if not ok:
+            self.errors += 1
+        if timed_out:
+            self.timeouts += 1
+
+    def summary(self, elapsed_s: float) -> dict:
+        values = sorted(self.latencies_ms)
+        count = len(values)
+        # Non-cumulative bucket counts: "le_5ms" holds 2ms < latency <= 5ms
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for v in values:
+            counts[bisect.bisect_left(BUCKETS_MS, v)] += 1
+        histogram = {f"le_{upper}ms": n for upper, n in zip(BUCKETS_MS, counts)}
+        histogram[f"gt_{BUCKETS_MS[-1]}ms"] = counts[-1]
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / elapsed_s, 2) if elapsed_s else 0.0,
+            "latency_ms": {
+                "mean": round(sum(values) / count, 3) if count else 0.0,
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+                "max": round(values[-1], 3) if values else 0.0,
+            },
+            "histogram": histogram,
+            "status_codes": {str(k): v for k, v in sorted(self.status_codes.items())},
+        }
+
+
+class VirtualUser:
+    def __init__(self, index: int, run_id: str):
+        self.email = f"loadtest-{run_id}-{index}@example.com"
+        self.password = f"pw-{run_id}-{index}"
+        self.token: Optional[str] = None
+        # ref_id -> index of the next tracking step
+        self.bookings: Dict[str, int] = {}
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+class LoadGenerator:
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.rng = random.Random(args.seed)
+        self.run_id = uuid4().hex[:8]
+        self.users = [VirtualUser(i, self.run_id) for i in range(args.users)]
+        self.stats: Dict[str, EndpointStats] = {}
+        # Flights seen in search results, used as booking targets
+        self.known_flights: List[dict] = []
+        self.start_date = date.fromisoformat(args.start_date)
+        self.airports = network_spec(args).airport_codes
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        if endpoint not in self.stats:
+            self.stats[endpoint] = EndpointStats()
+        return self.stats[endpoint]
+
+    async def _call(self, endpoint: str, scheduled: float, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self._stats(endpoint).record((time.perf_counter() - scheduled) * 1000, None, False)
+            return None
+        except asyncio.CancelledError:
+            # Still running at --drain-timeout: a timeout with the latency so far
+            self._stats(endpoint).record((time.perf_counter() - scheduled) * 1000, None, False, timed_out=True)
+            raise
+        self._stats(endpoint).record(
+            (time.perf_counter() - scheduled) * 1000, response.status_code, response.status_code < 400
+        )
+        return response
+
+    # --- Setup ---
+
+    async def register_users(self):
+        async def register(user: VirtualUser):
+            res = await self.client.post("/users/signup", json={
+                "email": user.email, "password": user.password, "name": f"Load Test {user.email}"
+            })
+            if res.status_code != 200:
+                res = await self.client.post("/users/login", json={"email": user.email, "password": user.password})
+            res.raise_for_status()
+            user.token = res.json()["access_token"]
+
+        # Signup hashes passwords, so register in small batches
+        for i in range(0, len(self.users), 10):
+            await asyncio.gather(*(register(u) for u in self.users[i:i + 10]))
+
+    # --- Operations ---
+
+    async def op_search(self, user: VirtualUser, scheduled: float):
+        origin, destination = self.rng.sample(self.airports, 2)
+        day = self.start_date + timedelta(days=self.rng.randrange(self.args.days))
+        res = await self._call("GET /route", scheduled, "GET", "/route", params={
+            "origin": origin, "destination": destination, "date": day.isoformat()
+        })
+        if res is not None and res.status_code == 200:
+            for route in res.json()[:5]:
+                self.known_flights.append({"route": route, "origin": origin, "destination": destination})
+            del self.known_flights[:-1000]
+
+    async def op_booking(self, user: VirtualUser, scheduled: float):
+        if not self.known_flights:
+            return await self.op_search(user, scheduled)
+        choice = self.rng.choice(self.known_flights)
+        ref_id = f"LT-{self.run_id}-{uuid4().hex[:10]}"
+        res = await self._call("POST /bookings", scheduled, "POST", "/bookings", headers=user.headers, json={
+            "ref_id": ref_id,
+            "origin": choice["origin"],
+            "destination": choice["destination"],
+            "pieces": self.rng.randint(1, 10),
+            "weight_kg": self.rng.randint(10, self.args.max_booking_kg),
+            "flight_ids": [leg["flight_id"] for leg in choice["route"]],
+        })
+        if res is not None and res.status_code == 200:
+            user.bookings[ref_id] = 0
+
+    async def op_tracking(self, user: VirtualUser, scheduled: float):
+        if not user.bookings:
+            return await self.op_booking(user, scheduled)
+        ref_id = self.rng.choice(list(user.bookings))
+        step = user.bookings[ref_id]
+        if step >= len(TRACKING_STEPS) or self.rng.random() < 0.5:
+            # Timeline read, as the tracking page polls it
+            await self._call("GET /bookings/{ref_id}", scheduled, "GET", f"/bookings/{ref_id}")
+            return
+        action = TRACKING_STEPS[step]
+        res = await self._call(
+            f"POST /bookings/{{ref_id}}/{action}", scheduled, "POST", f"/bookings/{ref_id}/{action}",
+            params={"location": self.rng.choice(self.airports)},
+        )
+        if res is not None and res.status_code == 200:
+            user.bookings[ref_id] = step + 1
+
+    async def op_login(self, user: VirtualUser, scheduled: float):
+        await self._call("POST /users/login", scheduled, "POST", "/users/login", json={
+            "email": user.email, "password": user.password
+        })
+
+    # --- Driver ---
+
+    async def run(self) -> dict:
+        await self.register_users()
+        operations = list(self.mix)
+        weights = [self.mix[o] for o in operations]
+        in_flight = set()
+
+        started = time.perf_counter()
+        next_arrival = started
+        end = started + self.args.duration
+        while next_arrival < end:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            operation = self.rng.choices(operations, weights)[0]
+            user = self.rng.choice(self.users)
+            task = asyncio.create_task(getattr(self, f"op_{operation}")(user, next_arrival))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            next_arrival += self.rng.expovariate(self.args.rate)
+
+        if in_flight:
+            _, pending = await asyncio.wait(in_flight, timeout=self.args.drain_timeout)
+            # Cancel what is left so the report counts it instead of leaving it running
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        total = EndpointStats()
+        for s in self.stats.values():
+            total.latencies_ms.extend(s.latencies_ms)
+            total.errors += s.errors
+            total.timeouts += s.timeouts
+            for code, n in s.status_codes.items():
+                total.status_codes[code] = total.status_codes.get(code, 0) + n
+
+        return {
+            "config": {
+                "base_url": str(self.client.base_url),
+                "rate_rps": self.args.rate,
+                "duration_s": self.args.duration,
+                "users": self.args.users,
+                "mix": self.mix,
+                "seed": self.args.seed,
+            },
+            "elapsed_s": round(elapsed, 3),
+            "total": total.summary(elapsed),
+            "endpoints": {name: s.summary(elapsed) for name, s in sorted(self.stats.items())},
+        }
+
+
+# --- Local stand-ins ---
+
+def network_spec(args: argparse.Namespace) -> NetworkSpec:
+    return NetworkSpec(
+        airports=args.airports,
+        hubs=args.hubs,
+        days=args.days,
+        flights_per_day=args.flights_per_day,
+        start_date=date.fromisoformat(args.start_date),
+        seed=args.seed,
+    )
+
+
+def seed_flights(path: str, spec: NetworkSpec) -> int:
+    """Writes a SQLite database with the synthetic network for `spec`."""
+    from db.sqlite_repository import SQLiteRepository
+
+    flights = generate_network(spec)
+    repo = SQLiteRepository(path)
+    asyncio.run(repo.insert_flights(flights))
+    repo.close()
+    return len(flights)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(args: argparse.Namespace, db_path: str) -> Tuple[subprocess.Popen, str]:
+    """Starts the API with uvicorn on SQLite and the in-process cache."""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": db_path,
+        "CACHE_BACKEND": "memory",
+    }
+    if not args.telemetry:
+        env["OTEL_SDK_DISABLED"] = "true"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL, # keep the JSON report on stdout clean
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health").status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Local server did not become healthy")
+
+
+async def main_async(args: argparse.Namespace, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        return await LoadGenerator(client, args).run()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--local", action="store_true", help="Start the API on local stand-ins (SQLite + in-process cache)")
+    parser.add_argument("--rate", type=float, default=50.0, help="Mean arrival rate, requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals")
+    parser.add_argument("--users", type=int, default=20, help="Virtual users")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights: search, booking, tracking, login")
+    parser.add_argument("--connections", type=int, default=200, help="Client connection pool size")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=30.0, help="Seconds to wait for in-flight requests")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start-date", default="2024-01-20", help="First schedule day searched")
+    parser.add_argument("--days", type=int, default=7, help="Schedule days searched")
+    parser.add_argument("--airports", type=int, default=10, help="Airports in the (synthetic) network")
+    parser.add_argument("--hubs", type=int, default=3, help="Hub airports of the seeded network (--local)")
+    parser.add_argument("--max-booking-kg", type=int, default=200)
+    parser.add_argument("--flights-per-day", type=int, default=500, help="Seeded flights per day (--local)")
+    parser.add_argument("--telemetry", action="store_true", help="Keep OpenTelemetry enabled on the local server")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    server = None
+    base_url = args.base_url
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            if args.local:
+                db_path = os.path.join(tmp, "loadtest.sqlite3")
+                count = seed_flights(db_path, network_spec(args))
+                print(f"Seeded {count} flights", file=sys.stderr)
+                server, base_url = start_local_server(args, db_path)
+            report = asyncio.run(main_async(args, base_url))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()